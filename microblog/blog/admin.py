@@ -1,15 +1,37 @@
 from django.contrib import admin
-from .models import Blog, Comment, UserProfile, Tag
+from .models import Anime, Blog, Comment, UserProfile, Tag
 from django.contrib.auth.forms import UserChangeForm, UserCreationForm
 from django.contrib.auth.admin import UserAdmin
 from .models import User
 from django.utils.translation import ugettext_lazy
 # Register your models here.
 
-admin.site.register(Blog)
-admin.site.register(Comment)
-admin.site.register(UserProfile)
+
+# 外部キーは全件のセレクトボックスにせず、idを入力するウィジェットにする
+@admin.register(Blog)
+class BlogAdmin(admin.ModelAdmin):
+    list_display = ('id', 'content', 'user', 'posted_date', 'like_num')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    ordering = ('-posted_date', '-id')
+
+
+@admin.register(Comment)
+class CommentAdmin(admin.ModelAdmin):
+    list_display = ('id', 'content', 'post', 'parent', 'commented_date')
+    list_select_related = ('post', 'parent')
+    raw_id_fields = ('post', 'parent')
+
+
+@admin.register(UserProfile)
+class UserProfileAdmin(admin.ModelAdmin):
+    list_display = ('user', 'bio')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+
+
 admin.site.register(Tag)
+admin.site.register(Anime)
 
 
 # adminサイトでemailを使う
@@ -43,7 +65,8 @@ class MyUserAdmin(UserAdmin):
     add_form = MyUserCreationForm
     list_display = ('email', 'nick_name', 'is_staff')
     list_filter = ('is_staff', 'is_superuser', 'is_active', 'groups')
-    search_fields = ('email', 'nick_name')
+    # 部分一致だとインデックスが使えないので前方一致で探す
+    search_fields = ('^email', '^nick_name')
     ordering = ('email',)
 
 
@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class AnimeCatalogError(Exception):
+    """アニメ情報APIから取得できなかった"""
+
+
+class AnimeCatalogClient:
+    """
+    ShangriLa Anime APIのクライアント。
+    (year, cours)ごとのレスポンスをキャッシュし、期限切れ後もしばらくは古い値を返しつつ裏で取り直す。
+    """
+
+    def __init__(self, endpoint, ttl=60 * 60, stale_ttl=60 * 60 * 24, timeout=(3.05, 5),
+                 pool_size=10, concurrency=4, clock=time.time):
+        self.endpoint = endpoint.rstrip('/')
+        # この秒数を過ぎたら取り直す
+        self.ttl = ttl
+        # この秒数まではキャッシュに残し、取り直している間は古い値を返す
+        self.stale_ttl = stale_ttl
+        # (接続, 読み取り)のタイムアウト秒
+        self.timeout = timeout
+        self.pool_size = pool_size
+        # 複数クールを同時に取得するときの最大並列数
+        self.concurrency = concurrency
+        self.clock = clock
+        self._local = threading.local()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='anime-catalog')
+        # スレッドを使い回してHTTPセッションも使い回す
+        self._fetch_executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='anime-catalog-fetch')
+
+    @property
+    def session(self):
+        """スレッドごとに使い回すHTTPセッション（コネクションプール付き）"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._local.session = session
+        return session
+
+    def url(self, year, cours=None):
+        url = "%s/%s" % (self.endpoint, year)
+        if cours:
+            url = "%s/%s" % (url, cours)
+        return url
+
+    def cache_key(self, year, cours=None):
+        return 'anime_catalog:%s:%s' % (year, cours or '')
+
+    def request(self, year, cours=None):
+        """APIを呼び出してアニメのリストを返す"""
+        try:
+            response = self.session.get(self.url(year, cours), timeout=self.timeout)
+            response.raise_for_status()
+            anime_list = response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise AnimeCatalogError(str(e)) from e
+
+        if not isinstance(anime_list, list):
+            raise AnimeCatalogError('unexpected response: %r' % (anime_list,))
+        return anime_list
+
+    def refresh(self, year, cours=None):
+        """APIから取り直してキャッシュに入れる"""
+        anime_list = self.request(year, cours)
+        cache.set(self.cache_key(year, cours), (self.clock(), anime_list), self.stale_ttl)
+        return anime_list
+
+    def fetch(self, year, cours=None):
+        """(year, cours)のアニメのリストを返す。キャッシュが新しければAPIは呼ばない"""
+        entry = cache.get(self.cache_key(year, cours))
+        if entry is None:
+            return self.refresh(year, cours)
+
+        fetched_at, anime_list = entry
+        if self.clock() - fetched_at >= self.ttl:
+            self._refresh_in_background(year, cours)
+        return anime_list
+
+    def fetch_seasons(self, seasons, use_cache=True):
+        """
+        複数の(year, cours)を並行して取得し、{(year, cours): アニメのリスト} を返す。
+        取得できなかったクールの値はAnimeCatalogErrorになる。
+        """
+        get = self.fetch if use_cache else self.request
+        futures = {season: self._fetch_executor.submit(get, *season) for season in seasons}
+
+        results = {}
+        for season, future in futures.items():
+            try:
+                results[season] = future.result()
+            except AnimeCatalogError as e:
+                results[season] = e
+        return results
+
+    def fetch_merged(self, seasons):
+        """複数クールをまとめて取得し、idで重複を除いてid順に並べたリストを返す"""
+        merged = {}
+        for season, anime_list in self.fetch_seasons(seasons).items():
+            if isinstance(anime_list, AnimeCatalogError):
+                raise anime_list
+            for anime in anime_list:
+                merged.setdefault(anime['id'], anime)
+        return [merged[anime_id] for anime_id in sorted(merged)]
+
+    def fetch_year(self, year):
+        """1年分(4クール)をまとめて取得する"""
+        return self.fetch_merged([(year, cours) for cours in range(1, 5)])
+
+    def _refresh_in_background(self, year, cours):
+        key = self.cache_key(year, cours)
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                self.refresh(year, cours)
+            except AnimeCatalogError:
+                logger.warning('アニメ情報の再取得に失敗しました: %s', key, exc_info=True)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        return self._executor.submit(run)
+
+
+anime_catalog = AnimeCatalogClient(
+    getattr(settings, 'ANIME_API_ENDPOINT', 'http://api.moemoe.tokyo/anime/v1/master'),
+    ttl=getattr(settings, 'ANIME_CATALOG_TTL', 60 * 60),
+    stale_ttl=getattr(settings, 'ANIME_CATALOG_STALE_TTL', 60 * 60 * 24),
+    concurrency=getattr(settings, 'ANIME_CATALOG_CONCURRENCY', 4),
+)
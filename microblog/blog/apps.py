@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class BlogConfig(AppConfig):
     name = 'blog'
+
+    def ready(self):
+        # シグナルのレシーバーを登録する
+        from blog import media, page_cache, post_cards, search, tag_index, tagging, thumbnails, user_stats  # noqa: F401
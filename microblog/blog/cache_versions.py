@@ -0,0 +1,49 @@
+import hashlib
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+# キャッシュのキーに含めるバージョン。値を変えると、そのバージョンを使ったキャッシュはすべて使われなくなる
+
+
+def version_key(name):
+    # 名前にはタグのキーやニックネーム（空白や日本語を含む）が入るので、どのバックエンドでも使えるキーにする
+    return 'cache_version:%s' % hashlib.md5(name.encode()).hexdigest()
+
+
+def new_version():
+    return uuid.uuid4().hex
+
+
+def get_versions(names):
+    """バージョンのリスト。キャッシュから消えていたら新しく振る"""
+    keys = [version_key(name) for name in names]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # 消えたバージョンを0などに戻すと、古いキャッシュが有効に見えてしまう
+            cache.add(key, new_version(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def renew(*names):
+    """バージョンをすぐに振り直す"""
+    if names:
+        cache.set_many({version_key(name): new_version() for name in names}, None)
+
+
+def bump(*names):
+    """
+    バージョンを振り直す。コミット前に振り直すと、別のリクエストが
+    古いデータで作ったキャッシュを新しいバージョンで保存してしまうので、コミット後に行う。
+    """
+    if names:
+        transaction.on_commit(lambda: renew(*names))
+
+
+def drop(*names):
+    """使われなくなったバージョンを消す"""
+    if names:
+        transaction.on_commit(lambda: cache.delete_many([version_key(name) for name in names]))
@@ -12,16 +12,12 @@ class BlogForm(forms.ModelForm):
     content = forms.CharField(label='つぶやき', widget=forms.Textarea(attrs={'placeholder': '(例)フリクリ最高！！'}))
     photo = forms.ImageField(label='画像', required=False)
     tag = forms.CharField(label='タグ', required=False, widget=forms.TextInput(
-            attrs={'placeholder': '(例)フリクリ、鶴巻和哉,ガイナックス'}))
+            attrs={'placeholder': '(例)フリクリ、鶴巻和哉,ガイナックス', 'list': 'tag-candidates', 'autocomplete': 'off'}))
 
     class Meta:
         model = Blog
-        fields = ["user", "content", "photo",]
-
-
-TagInlineFormSet = forms.inlineformset_factory(
-    Blog, Blog.tag.through, fields='__all__', can_delete=False
-)
+        # 投稿者はビューでログインユーザーを設定する
+        fields = ["content", "photo",]
 
 
 class CommentForm(forms.ModelForm):
@@ -64,6 +60,13 @@ class SearchForm(forms.Form):
         fields = ["year", "cours"]
 
 
+class PostSearchForm(forms.Form):
+    """投稿の全文検索フォーム"""
+
+    q = forms.CharField(label='キーワード', max_length=100, required=False,
+                        widget=forms.TextInput(attrs={'placeholder': '(例)フリクリ', 'type': 'search'}))
+
+
 class LoginForm(AuthenticationForm):
     """ログインフォーム"""
 
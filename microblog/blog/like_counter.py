@@ -0,0 +1,97 @@
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from blog.models import Blog
+from blog.page_cache import invalidate_posts
+
+logger = logging.getLogger(__name__)
+
+
+def is_buffered():
+    """いいね数をバッファしてまとめて書き込むモードかどうか"""
+    return getattr(settings, 'LIKE_COUNTER_BUFFERED', False)
+
+
+class LikeCounterBuffer:
+    """
+    Blog.like_numの増減をプロセス内に溜め、interval秒ごとにまとめてUPDATEする。
+    人気ポストへのいいねが同じ行への書き込みで直列化されるのを避けるためのもの。
+    """
+
+    def __init__(self, interval=None):
+        # intervalがNoneなら自動では書き込まない（flush()を呼ぶ）
+        self.interval = interval
+        self._pending = defaultdict(int)
+        # _pendingを守るロック
+        self._lock = threading.Lock()
+        # DBへ反映している間、件数の読み取りを待たせるロック
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def add(self, blog_id, delta):
+        with self._lock:
+            self._pending[blog_id] += delta
+        self._ensure_thread()
+
+    def pending(self, blog_id):
+        with self._lock:
+            return self._pending.get(blog_id, 0)
+
+    def like_num(self, blog_id):
+        """DBの値にまだ書き込んでいない増減を足したいいね数"""
+        with self._flush_lock:
+            like_num = Blog.objects.filter(pk=blog_id).values_list('like_num', flat=True).get()
+            return like_num + self.pending(blog_id)
+
+    def flush(self):
+        """溜まっている増減を、増減値ごとに1回のUPDATEで反映する"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, defaultdict(int)
+
+            by_delta = defaultdict(list)
+            for blog_id, delta in pending.items():
+                if delta:
+                    by_delta[delta].append(blog_id)
+            if not by_delta:
+                return
+
+            try:
+                with transaction.atomic():
+                    for delta, blog_ids in by_delta.items():
+                        Blog.objects.filter(pk__in=blog_ids).update(like_num=F('like_num') + delta)
+                    # いいね数を出しているページのキャッシュを捨てる
+                    invalidate_posts(pending)
+            except Exception:
+                # 書き込めなかった分は戻して次回に回す
+                with self._lock:
+                    for blog_id, delta in pending.items():
+                        self._pending[blog_id] += delta
+                raise
+
+    def _ensure_thread(self):
+        if self.interval is None or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='like-counter-flush', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('いいね数の書き込みに失敗しました')
+
+
+like_counter = LikeCounterBuffer(getattr(settings, 'LIKE_COUNTER_FLUSH_INTERVAL', 0.3))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import Blog, UserProfile
+from blog.thumbnails import generate_derivatives
+
+
+class Command(BaseCommand):
+    help = '投稿画像とプロフィール画像の派生画像（縮小版）をまとめて作成する'
+
+    def handle(self, *args, **options):
+        names = set(Blog.objects.exclude(photo='').exclude(photo__isnull=True).values_list('photo', flat=True))
+        names.update(UserProfile.objects.exclude(picture='').exclude(picture__isnull=True)
+                     .values_list('picture', flat=True))
+
+        for name in sorted(names):
+            try:
+                widths = generate_derivatives(name)
+            except (IOError, OSError) as e:
+                self.stderr.write('%s: 作成できませんでした (%s)' % (name, e))
+                continue
+            self.stdout.write('%s: %s' % (name, ', '.join(str(width) for width in widths) or '元画像のみ'))
@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from blog.models import Blog, Like
+
+
+class Command(BaseCommand):
+    help = 'Blog.like_numをLikeの行数と突き合わせ、ずれを報告・修正する'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='1回に確認するポスト数')
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help='チャンクごとに待つ秒数（他の書き込みに譲るため）')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='報告だけして修正しない')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        checked = drifted = total_drift = 0
+        last_id = 0
+
+        while True:
+            blog_ids = list(Blog.objects.filter(id__gt=last_id).order_by('id')
+                            .values_list('id', flat=True)[:chunk_size])
+            if not blog_ids:
+                break
+            last_id = blog_ids[-1]
+            checked += len(blog_ids)
+
+            # 読み取りだけでずれのあるポストを探す（書き込みロックは取らない）
+            rows = (Blog.objects.filter(id__in=blog_ids)
+                    .annotate(actual=Count('like'))
+                    .filter(~Q(like_num=F('actual')))
+                    .values_list('id', 'like_num', 'actual'))
+
+            drifted_ids = []
+            for blog_id, like_num, actual in rows:
+                drifted_ids.append(blog_id)
+                total_drift += abs(like_num - actual)
+                if options['verbosity'] >= 2:
+                    self.stdout.write('post %d: like_num=%d 実際=%d' % (blog_id, like_num, actual))
+            drifted += len(drifted_ids)
+
+            if drifted_ids and not options['dry_run']:
+                # 件数はUPDATE文の中で数え直すので、確認後に増えたいいねも取りこぼさない
+                like_count = (Like.objects.filter(post=OuterRef('pk')).order_by()
+                              .values('post').annotate(count=Count('id')).values('count'))
+                with transaction.atomic():
+                    Blog.objects.filter(id__in=drifted_ids).update(
+                        like_num=Coalesce(Subquery(like_count, output_field=IntegerField()), Value(0)))
+
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        action = '報告のみ' if options['dry_run'] else '修正済み'
+        self.stdout.write(self.style.SUCCESS(
+            '%d件中%d件のポストでずれがありました（ずれの合計: %d、%s）' % (checked, drifted, total_drift, action)))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from blog.media import MEDIA_SWEEP_GRACE, sweep_media
+
+
+class Command(BaseCommand):
+    help = '参照されなくなってから猶予を過ぎたアップロード画像と派生画像を削除する'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=MEDIA_SWEEP_GRACE,
+                            help='参照が0になってから削除するまでの秒数')
+
+    def handle(self, *args, **options):
+        swept = sweep_media(options['grace'])
+        self.stdout.write(self.style.SUCCESS('%d件の画像を削除しました' % swept))
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from blog.anime_catalog import AnimeCatalogError, anime_catalog
+from blog.forms import SearchForm
+from blog.models import Anime
+
+# 同期するフィールド（APIのキー名と同じ）
+SYNC_FIELDS = ['title', 'public_url', 'twitter_hash_tag']
+
+
+class Command(BaseCommand):
+    help = 'ShangriLa Anime APIのマスタをAnimeテーブルに同期する'
+
+    def add_arguments(self, parser):
+        years = [year for year, _ in SearchForm.years_choice if year]
+        parser.add_argument('--from', dest='year_from', type=int, default=min(years),
+                            help='同期を始める放送年')
+        parser.add_argument('--to', dest='year_to', type=int, default=max(years),
+                            help='同期を終える放送年')
+
+    def handle(self, *args, **options):
+        if options['year_from'] > options['year_to']:
+            raise CommandError('--from は --to 以下にしてください')
+
+        seasons = [(year, cours) for year in range(options['year_from'], options['year_to'] + 1)
+                   for cours, _ in Anime.COURS_CHOICES]
+        # APIへの問い合わせは並行して行い、DBへの反映はクールごとに順番に行う
+        results = anime_catalog.fetch_seasons(seasons, use_cache=False)
+
+        failed = 0
+        for (year, cours), anime_list in sorted(results.items()):
+            if isinstance(anime_list, AnimeCatalogError):
+                failed += 1
+                self.stderr.write('%d年%dクール: 取得に失敗しました (%s)' % (year, cours, anime_list))
+                continue
+
+            created, updated, deleted = self.sync_season(year, cours, anime_list)
+            self.stdout.write('%d年%dクール: 追加%d 更新%d 削除%d' % (year, cours, created, updated, deleted))
+
+        if failed:
+            raise CommandError('%dクール分の取得に失敗しました' % failed)
+        self.stdout.write(self.style.SUCCESS('同期しました'))
+
+    @transaction.atomic
+    def sync_season(self, year, cours, anime_list):
+        """1クール分をまとめて追加・更新・削除する"""
+        existing = {anime.api_id: anime for anime in Anime.objects.filter(year=year, cours=cours)}
+        new, changed, seen = [], [], set()
+
+        for item in anime_list:
+            api_id = item['id']
+            if api_id in seen:
+                continue
+            seen.add(api_id)
+            values = {field: item.get(field) or '' for field in SYNC_FIELDS}
+
+            anime = existing.get(api_id)
+            if anime is None:
+                new.append(Anime(api_id=api_id, year=year, cours=cours, **values))
+            elif any(getattr(anime, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(anime, field, value)
+                changed.append(anime)
+
+        Anime.objects.bulk_create(new)
+        Anime.objects.bulk_update(changed, SYNC_FIELDS)
+        deleted, _ = Anime.objects.filter(year=year, cours=cours).exclude(api_id__in=seen).delete()
+        return len(new), len(changed), deleted
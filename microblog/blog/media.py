@@ -0,0 +1,122 @@
+import logging
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from blog.models import Blog, MediaBlob, UserProfile
+from blog import thumbnails
+
+logger = logging.getLogger(__name__)
+
+# 参照が0になってから画像を消すまでの秒数。同じ画像のアップロードが保存とコミットの間にあっても消さないための猶予
+MEDIA_SWEEP_GRACE = getattr(settings, 'MEDIA_SWEEP_GRACE', 60 * 60)
+
+# 画像を参照しているモデルとフィールド
+MEDIA_FIELDS = {
+    Blog: 'photo',
+    UserProfile: 'picture',
+}
+
+
+def acquire(name):
+    """画像の参照を1つ増やす（参照が0で削除待ちだったものも使い直す）"""
+    if not name:
+        return
+    if MediaBlob.objects.filter(name=name).update(ref_count=F('ref_count') + 1, released_at=None):
+        return
+    try:
+        with transaction.atomic():
+            MediaBlob.objects.create(name=name, ref_count=1)
+    except IntegrityError:
+        # 同時に作られていた
+        MediaBlob.objects.filter(name=name).update(ref_count=F('ref_count') + 1, released_at=None)
+
+
+def release(name):
+    """
+    画像の参照を1つ減らす。どこからも参照されなくなっても、ここでは消さずに日時を記録しておく。
+    同じ画像の別のアップロードがファイルを書いた後、acquireをコミットする前かもしれないため。
+    """
+    if not name:
+        return
+    MediaBlob.objects.filter(name=name, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+    MediaBlob.objects.filter(name=name, ref_count=0, released_at__isnull=True).update(released_at=timezone.now())
+
+
+def recently_written(name, grace, storage=default_storage):
+    """ファイルが猶予の間に書かれたか（同じ内容のアップロードでも更新日時を新しくしている）"""
+    try:
+        return time.time() - os.path.getmtime(storage.path(name)) < grace
+    except (OSError, NotImplementedError):
+        return False
+
+
+def sweep_media(grace=MEDIA_SWEEP_GRACE, storage=default_storage):
+    """参照が0になってから猶予を過ぎた画像を削除する。削除した数を返す"""
+    cutoff = timezone.now() - timedelta(seconds=grace)
+    swept = 0
+    for blob_id in MediaBlob.objects.filter(ref_count=0, released_at__lte=cutoff).values_list('id', flat=True):
+        with transaction.atomic():
+            # acquireのUPDATEと同じ行ロックを取ってから確かめる
+            blob = MediaBlob.objects.select_for_update().filter(
+                id=blob_id, ref_count=0, released_at__lte=cutoff).first()
+            if blob is None or recently_written(blob.name, grace, storage):
+                continue
+            blob.delete()
+            delete_media(blob.name, storage)
+            swept += 1
+    return swept
+
+
+def delete_media(name, storage=default_storage):
+    """画像と派生画像を削除する"""
+    names = [name] + [thumbnails.derivative_name(name, width, ext)
+                      for width in thumbnails.THUMBNAIL_WIDTHS for ext, _, _ in thumbnails.THUMBNAIL_FORMATS]
+    try:
+        for path in names:
+            storage.delete(path)
+    except OSError:
+        logger.exception('画像の削除に失敗しました: %s', name)
+    cache.delete(thumbnails.cache_key(name))
+
+
+def media_name(instance):
+    return getattr(instance, MEDIA_FIELDS[type(instance)]).name or ''
+
+
+@receiver(pre_save, sender=Blog)
+@receiver(pre_save, sender=UserProfile)
+def remember_media(sender, instance, raw=False, update_fields=None, **kwargs):
+    field = MEDIA_FIELDS[sender]
+    if raw or (update_fields is not None and field not in update_fields):
+        return
+    old = ''
+    if instance.pk is not None:
+        old = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first() or ''
+    instance._old_media_name = old
+
+
+@receiver(post_save, sender=Blog)
+@receiver(post_save, sender=UserProfile)
+def update_media_refs(sender, instance, **kwargs):
+    if '_old_media_name' not in instance.__dict__:
+        return
+    old, new = instance.__dict__.pop('_old_media_name'), media_name(instance)
+    if old != new:
+        acquire(new)
+        release(old)
+
+
+@receiver(post_delete, sender=Blog)
+@receiver(post_delete, sender=UserProfile)
+def release_media(sender, instance, **kwargs):
+    release(media_name(instance))
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.10 on 2026-10-18 18:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0010_auto_20190417_2110'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(fields=['-posted_date', '-id'], name='blog_posted_id_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 2.2.10 on 2026-10-18 18:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def copy_posted_date(apps, schema_editor):
+    """既存の中間テーブルの行にポストの投稿日時を複製する"""
+    Blog = apps.get_model('blog', 'Blog')
+    BlogTag = apps.get_model('blog', 'BlogTag')
+    for blog_id, posted_date in Blog.objects.values_list('id', 'posted_date').iterator():
+        BlogTag.objects.filter(blog_id=blog_id).update(posted_date=posted_date)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_blog_posted_id_idx'),
+    ]
+
+    operations = [
+        # 自動生成された中間テーブル(blog_blog_tag)をそのままBlogTagモデルとして扱う
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='BlogTag',
+                    fields=[
+                        ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('blog', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='blog.Blog')),
+                        ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='blog.Tag')),
+                    ],
+                    options={
+                        'db_table': 'blog_blog_tag',
+                        'unique_together': {('blog', 'tag')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='blog',
+                    name='tag',
+                    field=models.ManyToManyField(blank=True, through='blog.BlogTag', to='blog.Tag'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='blogtag',
+            name='posted_date',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.RunPython(copy_posted_date, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='blogtag',
+            index=models.Index(fields=['tag', '-posted_date', '-id'], name='blogtag_tag_posted_idx'),
+        ),
+    ]
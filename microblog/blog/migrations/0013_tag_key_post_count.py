@@ -0,0 +1,60 @@
+# Generated by Django 2.2.10 on 2026-10-18 19:05
+
+from django.db import migrations, models
+import unicodedata
+
+
+def tag_key(name):
+    # blog.models.tag_key と同じ正規化（マイグレーション時点の定義を固定する）
+    key = " ".join(unicodedata.normalize('NFKC', name).casefold().split())
+    return key[:255]
+
+
+def merge_tags(apps, schema_editor):
+    """キーが重複するタグを最も古いタグにまとめ、ポスト数を数え直す"""
+    Tag = apps.get_model('blog', 'Tag')
+    BlogTag = apps.get_model('blog', 'BlogTag')
+
+    survivors = {}
+    for tag in Tag.objects.order_by('id'):
+        key = tag_key(tag.name)
+        if key not in survivors:
+            survivors[key] = tag.id
+            Tag.objects.filter(id=tag.id).update(key=key)
+            continue
+
+        survivor_id = survivors[key]
+        tagged = BlogTag.objects.filter(tag_id=survivor_id).values('blog_id')
+        BlogTag.objects.filter(tag_id=tag.id, blog_id__in=tagged).delete()
+        BlogTag.objects.filter(tag_id=tag.id).update(tag_id=survivor_id)
+        tag.delete()
+
+    counts = BlogTag.objects.values('tag_id').annotate(count=models.Count('id')).values_list('tag_id', 'count')
+    for tag_id, count in counts:
+        Tag.objects.filter(id=tag_id).update(post_count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_blogtag'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='key',
+            field=models.CharField(editable=False, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(merge_tags, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tag',
+            name='key',
+            field=models.CharField(editable=False, max_length=255, unique=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.10 on 2026-10-18 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0013_tag_key_post_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'commented_date', 'id'], name='comment_post_date_idx'),
+        ),
+    ]
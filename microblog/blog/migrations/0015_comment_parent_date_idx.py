@@ -0,0 +1,17 @@
+# Generated by Django 2.2.10 on 2026-10-18 18:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0014_comment_post_date_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['parent', 'commented_date', 'id'], name='comment_parent_date_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.10 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+def remove_duplicate_likes(apps, schema_editor):
+    """同じユーザー・ポストのいいねが複数あれば最も古い1件だけ残す"""
+    Like = apps.get_model('blog', 'Like')
+    duplicates = (Like.objects.values('user_id', 'post_id')
+                  .annotate(first_id=models.Min('id'), count=models.Count('id'))
+                  .filter(count__gt=1))
+    for row in duplicates:
+        (Like.objects.filter(user_id=row['user_id'], post_id=row['post_id'])
+         .exclude(id=row['first_id']).delete())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0015_comment_parent_date_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_likes, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='like',
+            unique_together={('user', 'post')},
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.10 on 2026-10-18 18:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0016_like_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Anime',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('api_id', models.IntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('year', models.PositiveSmallIntegerField()),
+                ('cours', models.PositiveSmallIntegerField(choices=[(1, '春'), (2, '夏'), (3, '秋'), (4, '冬')])),
+                ('public_url', models.CharField(blank=True, max_length=255)),
+                ('twitter_hash_tag', models.CharField(blank=True, max_length=255)),
+                ('synced_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['year', 'cours', 'api_id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='anime',
+            index=models.Index(fields=['title'], name='anime_title_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='anime',
+            unique_together={('year', 'cours', 'api_id')},
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.10 on 2026-10-18 19:01
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def count_references(apps, schema_editor):
+    """既存のポスト画像とプロフィール画像の参照数を数えておく"""
+    Blog = apps.get_model('blog', 'Blog')
+    UserProfile = apps.get_model('blog', 'UserProfile')
+    MediaBlob = apps.get_model('blog', 'MediaBlob')
+
+    counts = Counter()
+    counts.update(name for name in Blog.objects.values_list('photo', flat=True).iterator() if name)
+    counts.update(name for name in UserProfile.objects.values_list('picture', flat=True).iterator() if name)
+    MediaBlob.objects.bulk_create([MediaBlob(name=name, ref_count=count) for name, count in counts.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0017_anime'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.10 on 2026-10-18 19:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0018_mediablob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(fields=['user', '-posted_date', '-id'], name='blog_user_posted_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 2.2.10 on 2026-10-18 21:40
+
+import re
+import unicodedata
+
+from django.db import migrations
+
+# blog.searchの定義をこの時点のまま写しておく（後で変わってもこのマイグレーションの結果は変えない）
+SQLITE_TABLE = 'blog_post_fts'
+POSTGRES_TABLE = 'blog_post_search'
+WORD_RE = re.compile(r'\w+')
+
+
+def bigrams(text):
+    """語ごとに2文字ずつずらして区切る。1文字の語はそのまま"""
+    grams = []
+    for word in WORD_RE.findall(unicodedata.normalize('NFKC', text or '').casefold()):
+        if len(word) == 1:
+            grams.append(word)
+        else:
+            grams.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return grams
+
+
+def create_index(apps, schema_editor):
+    """全文検索の索引を作り、既存のポストを入れておく"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE %s USING fts5(body, tokenize='unicode61 remove_diacritics 0')" % SQLITE_TABLE)
+        insert = 'INSERT INTO %s (rowid, body) VALUES (%%s, %%s)' % SQLITE_TABLE
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE TABLE %s (blog_id integer PRIMARY KEY REFERENCES blog_blog (id) ON DELETE CASCADE, '
+            'body tsvector NOT NULL)' % POSTGRES_TABLE)
+        schema_editor.execute('CREATE INDEX %s_body_idx ON %s USING GIN (body)' % (POSTGRES_TABLE, POSTGRES_TABLE))
+        insert = "INSERT INTO %s (blog_id, body) VALUES (%%s, to_tsvector('simple', %%s))" % POSTGRES_TABLE
+    else:
+        # その他のDBでは部分一致で検索するので索引は作らない
+        return
+
+    Blog = apps.get_model('blog', 'Blog')
+    for blog_id, content in Blog.objects.values_list('id', 'content').iterator():
+        schema_editor.execute(insert, [blog_id, ' '.join(bigrams(content))])
+
+
+def drop_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS %s' % SQLITE_TABLE)
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP TABLE IF EXISTS %s' % POSTGRES_TABLE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0019_blog_user_posted_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
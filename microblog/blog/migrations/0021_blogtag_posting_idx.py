@@ -0,0 +1,17 @@
+# Generated by Django 2.2.10 on 2026-10-18 22:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0020_post_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blogtag',
+            index=models.Index(fields=['tag', '-posted_date', '-blog'], name='blogtag_tag_posted_blog_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 2.2.10 on 2026-10-19 10:20
+
+import re
+import unicodedata
+
+from django.db import migrations
+
+# blog.searchの定義をこの時点のまま写しておく（後で変わってもこのマイグレーションの結果は変えない）
+SQLITE_TABLE = 'blog_post_fts'
+POSTGRES_TABLE = 'blog_post_search'
+WORD_RE = re.compile(r'\w+')
+
+
+def index_terms(text):
+    """語ごとの2文字単位の後ろに、語の最後の1文字を足す"""
+    terms = []
+    for word in WORD_RE.findall(unicodedata.normalize('NFKC', text or '').casefold()):
+        if len(word) == 1:
+            terms.append(word)
+        else:
+            terms.extend(word[i:i + 2] for i in range(len(word) - 1))
+            terms.append(word[-1])
+    return terms
+
+
+def reindex(apps, schema_editor):
+    """語末の1文字を入れて索引を作り直す"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        update = 'UPDATE %s SET body = %%s WHERE rowid = %%s' % SQLITE_TABLE
+    elif vendor == 'postgresql':
+        update = "UPDATE %s SET body = to_tsvector('simple', %%s) WHERE blog_id = %%s" % POSTGRES_TABLE
+    else:
+        return
+
+    Blog = apps.get_model('blog', 'Blog')
+    for blog_id, content in Blog.objects.values_list('id', 'content').iterator():
+        schema_editor.execute(update, [' '.join(index_terms(content)), blog_id])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0021_blogtag_posting_idx'),
+    ]
+
+    operations = [
+        # 逆向きは語末の1文字が残るだけで検索結果は変わらないので、何もしない
+        migrations.RunPython(reindex, migrations.RunPython.noop),
+    ]
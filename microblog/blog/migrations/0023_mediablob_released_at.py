@@ -0,0 +1,22 @@
+# Generated by Django 2.2.10 on 2026-10-19 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0022_post_search_word_final'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediablob',
+            name='released_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='mediablob',
+            index=models.Index(fields=['ref_count', 'released_at'], name='mediablob_released_idx'),
+        ),
+    ]
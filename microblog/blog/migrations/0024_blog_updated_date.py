@@ -0,0 +1,18 @@
+# Generated by Django 2.2.10 on 2026-10-19 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0023_mediablob_released_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='updated_date',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -9,34 +9,101 @@ from django.utils import timezone
 from django.contrib.auth.base_user import BaseUserManager
 from django.dispatch import receiver
 from .exeption_models import BaseManager
+import unicodedata
+
+
+def tag_key(name):
+    """
+    タグの同一性を判定するキー。
+    全角半角を揃え(NFKC)、大文字小文字を区別せず、空白をまとめる。
+    """
+    key = " ".join(unicodedata.normalize('NFKC', name).casefold().split())
+    return key[:255]
+
+
+class TagManager(BaseManager):
+
+    def get_by_name(self, name):
+        """正規化したキーでタグを引く。無ければNone"""
+        return self.get_or_none(key=tag_key(name))
 
 
 class Tag(models.Model):
     """ タグ """
-    objects = BaseManager()
+    objects = TagManager()
     name = models.CharField(max_length=255)
+    key = models.CharField(max_length=255, unique=True, editable=False)
+    # このタグが付いたポスト数（中間テーブルを数えずに済むよう非正規化して持つ）
+    post_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    def save(self, *args, **kwargs):
+        self.key = tag_key(self.name)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
 
+def liked_by(user, post_ref='pk'):
+    """post_refのポストをuserがいいね済みかどうかを表す式（未ログインなら常にFalse）"""
+    if not user.is_authenticated:
+        return models.Value(False, output_field=models.BooleanField())
+    return models.Exists(Like.objects.filter(post=models.OuterRef(post_ref), user=user))
+
+
+class BlogQuerySet(models.QuerySet):
+
+    def with_like_state(self, user):
+        """いいね数(like_num)と、userがいいね済みか(liked_by_me)を同じクエリで取得する"""
+        return self.annotate(liked_by_me=liked_by(user))
+
+
 class Blog(models.Model):
     """ ポスト"""
+    objects = BaseManager.from_queryset(BlogQuerySet)()
     content = models.CharField(max_length=255)
     photo = models.ImageField(upload_to='anicolleblog', blank=True, null=True)
     posted_date = models.DateTimeField(auto_now_add=True)
-    tag = models.ManyToManyField(Tag, blank=True)
+    # 保存のたびに更新する。表示が変わったかどうか（ETag）の判定に使う
+    updated_date = models.DateTimeField(auto_now=True)
+    tag = models.ManyToManyField(Tag, blank=True, through='BlogTag')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     like_num = models.IntegerField(default=0)
 
     class Meta:
         ordering = ['-posted_date']
+        indexes = [
+            # タイムラインのカーソルページネーション用
+            models.Index(fields=['-posted_date', '-id'], name='blog_posted_id_idx'),
+            # プロフィールの投稿一覧のカーソルページネーション用
+            models.Index(fields=['user', '-posted_date', '-id'], name='blog_user_posted_idx'),
+        ]
 
     def __str__(self):
         return self.content
 
 
+class BlogTag(models.Model):
+    """ ポストとタグの中間テーブル """
+    blog = models.ForeignKey(Blog, on_delete=models.CASCADE)
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
+    # タグ別タイムラインをこのテーブルのインデックスだけで並べるため、ポストの投稿日時を複製して持つ
+    posted_date = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        db_table = 'blog_blog_tag'
+        unique_together = (('blog', 'tag'),)
+        indexes = [
+            models.Index(fields=['tag', '-posted_date', '-id'], name='blogtag_tag_posted_idx'),
+            # タグ式で使うタグごとのポスティングリスト。テーブルを引かずにインデックスだけで読める
+            models.Index(fields=['tag', '-posted_date', '-blog'], name='blogtag_tag_posted_blog_idx'),
+        ]
+
+    def __str__(self):
+        return '%s - %s' % (self.blog_id, self.tag_id)
+
+
 class Comment(models.Model):
     """ コメント """
     content = models.TextField('コメント')
@@ -45,6 +112,14 @@ class Comment(models.Model):
     parent = models.ForeignKey('self', verbose_name='親コメント', null=True, blank=True, on_delete=models.CASCADE)
     commented_date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # 記事ごとのコメントを投稿順に取得するため
+            models.Index(fields=['post', 'commented_date', 'id'], name='comment_post_date_idx'),
+            # 返信を投稿順にページングするため
+            models.Index(fields=['parent', 'commented_date', 'id'], name='comment_parent_date_idx'),
+        ]
+
     def __str__(self):
         return self.content
 
@@ -56,6 +131,10 @@ class Like(models.Model):
     post = models.ForeignKey(Blog, on_delete=models.CASCADE)
     created_date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # 同じユーザーは1つのポストに1回だけいいねできる
+        unique_together = (('user', 'post'),)
+
     def __str__(self):
         return self.user
 
@@ -71,6 +150,50 @@ class UserProfile(models.Model):
         return self.user.username
 
 
+class Anime(models.Model):
+    """ アニメ（ShangriLa Anime APIのマスタを同期したもの） """
+    COURS_CHOICES = (
+        (1, '春'),
+        (2, '夏'),
+        (3, '秋'),
+        (4, '冬'),
+    )
+    api_id = models.IntegerField()
+    title = models.CharField(max_length=255)
+    year = models.PositiveSmallIntegerField()
+    cours = models.PositiveSmallIntegerField(choices=COURS_CHOICES)
+    public_url = models.CharField(max_length=255, blank=True)
+    twitter_hash_tag = models.CharField(max_length=255, blank=True)
+    synced_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['year', 'cours', 'api_id']
+        unique_together = (('year', 'cours', 'api_id'),)
+        indexes = [
+            models.Index(fields=['title'], name='anime_title_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class MediaBlob(models.Model):
+    """ アップロード画像の実体（内容のハッシュ名）と、それを参照している行の数 """
+    name = models.CharField(max_length=255, unique=True)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # 参照が0になった日時。ファイルはすぐには消さず、sweep_mediaで猶予を過ぎたものを消す
+    released_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ref_count', 'released_at'], name='mediablob_released_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
 class UserManager(BaseUserManager):
     """ユーザーマネージャー."""
 
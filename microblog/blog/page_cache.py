@@ -0,0 +1,220 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.middleware.csrf import get_token
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import urlencode
+
+from blog.cache_versions import bump, get_versions, renew
+from blog.models import Blog, Comment, Like, Tag, UserProfile
+from blog.tagging import tags_changed
+
+User = get_user_model()
+
+# 匿名ユーザー向けのページ全体のキャッシュ。期限は付けず、表示しているデータが変わったらバージョンを振り直して捨てる。
+# バージョンの振り直しは同じキャッシュを見ているワーカーにしか届かないので、複数ワーカーでは共有キャッシュにする
+# すべてのページが依存するバージョン（ニックネームの変更など、どのページに出ているか追えないもの）
+ALL_PAGES = 'page:all'
+# タイムライン（index）
+TIMELINE = 'page:timeline'
+# ページの表示を変えるクエリパラメータ。これ以外のパラメータではキャッシュを分けない
+PAGE_PARAMS = ('cursor', 'page')
+
+
+def blog_page(blog_id):
+    return 'page:blog:%s' % blog_id
+
+
+def tag_page(key):
+    return 'page:tag:%s' % key
+
+
+def profile_page(nick_name):
+    return 'page:profile:%s' % nick_name
+
+
+def is_cacheable_request(request):
+    """セッションもメッセージも持たない匿名ユーザーのGETかどうか"""
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    # セッションがあれば、ログイン中かセッションにメッセージが入っているかもしれない
+    return settings.SESSION_COOKIE_NAME not in request.COOKIES and CookieStorage.cookie_name not in request.COOKIES
+
+
+def is_cacheable_response(request, response):
+    """他の人に返しても問題ないレスポンスかどうか（クッキー・CSRFトークン・メッセージを使っていない）"""
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return False
+    # CSRFトークンを埋め込んだページはクッキーと対になっているので共有できない
+    if request.META.get('CSRF_COOKIE_USED'):
+        return False
+    storage = getattr(request, '_messages', None)
+    if storage is not None and (storage.used or storage.added_new):
+        return False
+    session = getattr(request, 'session', None)
+    return session is None or not session.modified
+
+
+def page_path(request):
+    """パスとPAGE_PARAMSだけのURL（未知のパラメータを付けてもキャッシュが増えないように）"""
+    params = [(name, request.GET[name]) for name in PAGE_PARAMS if name in request.GET]
+    return '%s?%s' % (request.path, urlencode(params)) if params else request.path
+
+
+def page_cache_key(request, dependencies):
+    versions = get_versions([ALL_PAGES] + list(dependencies))
+    path = hashlib.md5(page_path(request).encode()).hexdigest()
+    return 'page_cache:%s:%s' % (path, hashlib.md5(':'.join(versions).encode()).hexdigest())
+
+
+class AnonymousPageCacheMixin:
+    """
+    匿名ユーザーへのレスポンスを丸ごとキャッシュする。
+    page_cache_dependencies()が返すバージョンが振り直されるまで同じレスポンスを返す。
+    """
+    # キャッシュするレスポンスを描画中かどうか。期限なしで保存するので、他のキャッシュの古い値を使わない
+    page_cacheable = False
+
+    def page_cache_dependencies(self):
+        return []
+
+    def dispatch(self, request, *args, **kwargs):
+        if not is_cacheable_request(request):
+            return super().dispatch(request, *args, **kwargs)
+        self.page_cacheable = True
+
+        # 描画前にバージョンを決めておき、描画中に変更があっても古いバージョンで保存されるようにする
+        key = page_cache_key(request, self.page_cache_dependencies())
+        response = cache.get(key)
+        if response is not None:
+            # 保存したときのETagが一致すれば304にする
+            return get_conditional_response(request, etag=response.get('ETag'), response=response)
+
+        response = super().dispatch(request, *args, **kwargs)
+
+        def store(response):
+            if is_cacheable_response(request, response):
+                cache.set(key, response, None)
+
+        if getattr(response, 'is_rendered', True):
+            store(response)
+        else:
+            response.add_post_render_callback(store)
+        return response
+
+
+def post_pages(blog_ids):
+    """ポストを出しているページ（タイムライン・詳細・投稿者のプロフィール・付いているタグ）"""
+    nick_names = User.objects.filter(blog__id__in=blog_ids).values_list('nick_name', flat=True).distinct()
+    tag_keys = Tag.objects.filter(blogtag__blog_id__in=blog_ids).values_list('key', flat=True).distinct()
+    return ([TIMELINE]
+            + [blog_page(blog_id) for blog_id in blog_ids]
+            + [profile_page(nick_name) for nick_name in nick_names]
+            + [tag_page(key) for key in tag_keys])
+
+
+def page_etag(request, state):
+    """ページのデータの集計値（page_etag_state()）と閲覧者から作るETag"""
+    # いいね済みかどうかや編集リンクは閲覧者で変わる
+    viewer = ''
+    if request.user.is_authenticated:
+        # ページに埋め込むCSRFトークンはログインし直すと変わるので、その元になるクッキーの値も含める
+        get_token(request)
+        viewer = '%s:%s' % (request.user.pk, request.META['CSRF_COOKIE'])
+    source = '%s:%s:%r' % (page_path(request), viewer, state)
+    return '"%s"' % hashlib.md5(source.encode()).hexdigest()
+
+
+class ConditionalGetMixin:
+    """
+    page_etag_state()が返すDBの集計値からETagを作り、If-None-Matchが一致すれば
+    ページを組み立てずに304を返す。キャッシュのバージョンはワーカーごとに違うことがある
+    （LocMemCache）ので、どのワーカーでも同じ値になるDBの値を使う。
+    """
+
+    def page_etag_state(self):
+        """ページの表示が変われば変わる値（最終更新日時・件数など、インデックスで安く取れるもの）"""
+        raise NotImplementedError
+
+    def dispatch(self, request, *args, **kwargs):
+        # 次に表示するメッセージがあれば、ブラウザのキャッシュを使わせない
+        if request.method not in ('GET', 'HEAD') or CookieStorage.cookie_name in request.COOKIES:
+            return super().dispatch(request, *args, **kwargs)
+
+        etag = page_etag(request, self.page_etag_state())
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            return response
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+        return response
+
+
+def invalidate_posts(blog_ids):
+    """ポストの表示が変わったときに、そのポストを出しているページを捨てる"""
+    blog_ids = list(blog_ids)
+    if blog_ids:
+        # ページを調べるクエリもトランザクションの外で行う
+        transaction.on_commit(lambda: renew(*post_pages(blog_ids)))
+
+
+@receiver(post_save, sender=Blog)
+def blog_saved(sender, instance, **kwargs):
+    invalidate_posts([instance.pk])
+
+
+@receiver(pre_delete, sender=Blog)
+def blog_deleting(sender, instance, **kwargs):
+    # 削除後はタグの中間テーブルが消えているので、削除前に調べる
+    bump(*post_pages([instance.pk]))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    bump(blog_page(instance.post_id))
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+def like_changed(sender, instance, **kwargs):
+    invalidate_posts([instance.post_id])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    bump(tag_page(instance.key))
+
+
+@receiver(tags_changed)
+def post_tags_changed(sender, tag_ids, blog_ids, **kwargs):
+    def pages():
+        tag_keys = Tag.objects.filter(id__in=tag_ids).values_list('key', flat=True)
+        return [tag_page(key) for key in tag_keys] + [blog_page(blog_id) for blog_id in blog_ids]
+    transaction.on_commit(lambda: renew(*pages()))
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, update_fields=None, **kwargs):
+    # ニックネームはどのページにも出ているので、全ページを捨てる（ログイン時のlast_loginの更新などは除く）
+    if not created and (update_fields is None or 'nick_name' in update_fields):
+        bump(ALL_PAGES)
+        # ポストに出ているニックネームが変わるので、ETagのためにポストの更新日時も進める
+        Blog.objects.filter(user=instance).update(updated_date=timezone.now())
+
+
+@receiver(post_save, sender=UserProfile)
+def profile_changed(sender, instance, created, **kwargs):
+    # プロフィール画像と自己紹介はプロフィールのページにだけ出ている
+    if not created:
+        bump(profile_page(instance.user.nick_name))
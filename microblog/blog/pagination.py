@@ -0,0 +1,130 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+# カーソルのpkとして受け付ける範囲（64ビット符号付き整数。超えるとDBに渡すときにOverflowErrorになる）
+MAX_CURSOR_PK = 2 ** 63 - 1
+
+
+class InvalidCursor(Exception):
+    """不正なカーソルトークン"""
+
+
+class CursorPage:
+    """カーソルページネーションの1ページ分"""
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    (ordering_field, id) のキーセットでページングする。
+    COUNTもOFFSETも発行しないので、何ページ目でも1クエリのコストは変わらない。
+    """
+
+    def __init__(self, queryset, per_page, ordering_field='posted_date', descending=True):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering_field = ordering_field
+        self.descending = descending
+
+    def encode_cursor(self, obj, direction):
+        """オブジェクトの位置を不透明なトークンにする"""
+        value = getattr(obj, self.ordering_field)
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        raw = json.dumps([direction, value, obj.pk], separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """トークンを (方向, 値, pk) に戻す。壊れていればInvalidCursor"""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, value, pk = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+            field = self.queryset.model._meta.get_field(self.ordering_field)
+            value = field.to_python(value)
+            pk = int(pk)
+        except (ValueError, TypeError, ValidationError, binascii.Error, UnicodeDecodeError):
+            raise InvalidCursor(cursor)
+        if direction not in ('next', 'prev') or value is None or not -MAX_CURSOR_PK - 1 <= pk <= MAX_CURSOR_PK:
+            raise InvalidCursor(cursor)
+        return direction, value, pk
+
+    def _seek(self, queryset, value, pk, forward):
+        """カーソル位置より先(forward)または手前の行に絞り込む"""
+        # 降順で「先」は値が小さい側になる
+        lookup = 'lt' if forward == self.descending else 'gt'
+        field = self.ordering_field
+        return queryset.filter(
+            Q(**{'%s__%s' % (field, lookup): value}) |
+            Q(**{field: value, 'pk__%s' % lookup: pk})
+        )
+
+    def _order(self, queryset, forward):
+        ascending = forward != self.descending
+        prefix = '' if ascending else '-'
+        return queryset.order_by(prefix + self.ordering_field, prefix + 'pk')
+
+    def page(self, cursor=None):
+        """カーソルに対応するページを返す。カーソルが無ければ先頭ページ"""
+        direction, value, pk = ('next', None, None)
+        if cursor:
+            direction, value, pk = self.decode_cursor(cursor)
+
+        forward = direction == 'next'
+        queryset = self._order(self.queryset, forward)
+        if value is not None:
+            queryset = self._seek(queryset, value, pk, forward)
+
+        # 1件余分に取って次ページの有無を判定する
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if not forward:
+            rows.reverse()
+
+        if forward:
+            has_next, has_previous = has_more, value is not None
+        else:
+            has_next, has_previous = True, has_more
+
+        next_cursor = self.encode_cursor(rows[-1], 'next') if rows and has_next else None
+        previous_cursor = self.encode_cursor(rows[0], 'prev') if rows and has_previous else None
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+
+class CursorPaginationMixin:
+    """ListViewのページネーションをカーソル方式に差し替える"""
+    cursor_kwarg = 'cursor'
+    cursor_ordering_field = 'posted_date'
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = CursorPaginator(queryset, page_size, ordering_field=self.cursor_ordering_field)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor:
+            page = paginator.page()
+        return (paginator, page, page.object_list, page.has_other_pages())
@@ -0,0 +1,54 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from blog.cache_versions import bump, drop, get_versions
+from blog.models import Blog
+from blog.thumbnails import derivatives_generated
+
+User = get_user_model()
+
+# 描画済みのカードはバージョンが変わるまで使い回す（期限なし）
+POST_CARD_TIMEOUT = None
+
+
+def versions(blog):
+    """ポストと投稿者のバージョン"""
+    return get_versions(['post_card:blog:%s' % blog.pk, 'post_card:user:%s' % blog.user_id])
+
+
+def render_post_card(blog, template_name):
+    """ポストのカード（本文・画像・投稿者）を描画する。バージョンが同じならキャッシュを返す"""
+    key = 'post_card:%s:%s:%s:%s' % (template_name, blog.pk, *versions(blog))
+    html = cache.get(key)
+    if html is None:
+        html = render_to_string(template_name, {'blog': blog})
+        cache.set(key, html, POST_CARD_TIMEOUT)
+    return mark_safe(html)
+
+
+@receiver(post_save, sender=Blog)
+def blog_changed(sender, instance, **kwargs):
+    bump('post_card:blog:%s' % instance.pk)
+
+
+@receiver(post_delete, sender=Blog)
+def blog_deleted(sender, instance, **kwargs):
+    drop('post_card:blog:%s' % instance.pk)
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # ログイン時のlast_loginの更新などでは消さない
+    if update_fields is None or 'nick_name' in update_fields:
+        bump('post_card:user:%s' % instance.pk)
+
+
+@receiver(derivatives_generated)
+def photo_resized(sender, name, **kwargs):
+    # 派生画像ができたら、srcset付きで描画し直す
+    blog_ids = Blog.objects.filter(photo=name).values_list('id', flat=True)
+    bump(*['post_card:blog:%s' % blog_id for blog_id in blog_ids])
@@ -0,0 +1,182 @@
+import base64
+import binascii
+import json
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from blog.models import Blog
+from blog.pagination import CursorPage, InvalidCursor
+
+# 全文検索の索引（SQLiteはFTS5の仮想テーブル、PostgreSQLはtsvectorの列を持つテーブル）
+SQLITE_TABLE = 'blog_post_fts'
+POSTGRES_TABLE = 'blog_post_search'
+WORD_RE = re.compile(r'\w+')
+
+
+def words(text):
+    """NFKC・casefoldした文字列の語のリスト"""
+    return WORD_RE.findall(unicodedata.normalize('NFKC', text or '').casefold())
+
+
+def word_bigrams(word):
+    """語を2文字ずつずらして区切る（フリクリ → フリ リク クリ）。1文字の語はそのまま"""
+    if len(word) == 1:
+        return [word]
+    return [word[i:i + 2] for i in range(len(word) - 1)]
+
+
+def bigrams(text):
+    """
+    語ごとの2文字単位のリスト。
+    日本語は空白で区切られないので、索引も検索語もこの2文字単位で扱う。
+    """
+    return [gram for word in words(text) for gram in word_bigrams(word)]
+
+
+def index_terms(text):
+    """
+    索引に入れる語。語ごとの2文字単位の後ろに、語の最後の1文字を足す。
+    1文字の検索は前方一致なので、これが無いと語末の文字（うちの猫の「猫」）が見つからない。
+    """
+    terms = []
+    for word in words(text):
+        terms.extend(word_bigrams(word))
+        if len(word) > 1:
+            terms.append(word[-1])
+    return terms
+
+
+def query_words(query):
+    """検索語を語ごとの2文字単位のリストにする。1文字の語は前方一致で探す"""
+    return [word_bigrams(word) for word in words(query)]
+
+
+def fts5_query(words):
+    """語ごとのフレーズをANDでつないだFTS5の検索式"""
+    phrases = []
+    for grams in words:
+        if len(grams) == 1 and len(grams[0]) == 1:
+            phrases.append('"%s"*' % grams[0])
+        else:
+            phrases.append('"%s"' % ' '.join(grams))
+    return ' AND '.join(phrases)
+
+
+def tsquery(words):
+    """語ごとのフレーズ(<->)を&でつないだPostgreSQLの検索式"""
+    phrases = []
+    for grams in words:
+        if len(grams) == 1 and len(grams[0]) == 1:
+            phrases.append("'%s':*" % grams[0])
+        else:
+            phrases.append('(%s)' % ' <-> '.join("'%s'" % gram for gram in grams))
+    return ' & '.join(phrases)
+
+
+def is_supported():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def index_post(blog_id, content):
+    """ポストの本文を索引に入れる（入っていれば置き換える）"""
+    body = ' '.join(index_terms(content))
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('DELETE FROM %s WHERE rowid = %%s' % SQLITE_TABLE, [blog_id])
+            cursor.execute('INSERT INTO %s (rowid, body) VALUES (%%s, %%s)' % SQLITE_TABLE, [blog_id, body])
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                "INSERT INTO %s (blog_id, body) VALUES (%%s, to_tsvector('simple', %%s)) "
+                "ON CONFLICT (blog_id) DO UPDATE SET body = EXCLUDED.body" % POSTGRES_TABLE, [blog_id, body])
+
+
+def unindex_post(blog_id):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('DELETE FROM %s WHERE rowid = %%s' % SQLITE_TABLE, [blog_id])
+        elif connection.vendor == 'postgresql':
+            cursor.execute('DELETE FROM %s WHERE blog_id = %%s' % POSTGRES_TABLE, [blog_id])
+
+
+def encode_cursor(score, blog_id):
+    raw = json.dumps([score, blog_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        score, blog_id = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        return float(score), int(blog_id)
+    except (ValueError, TypeError, binascii.Error, UnicodeDecodeError):
+        raise InvalidCursor(cursor)
+
+
+def ranked_ids(words, limit, after=None):
+    """
+    関連度の高い順（スコアの小さい順）に(スコア, ポストのid)を返す。
+    afterには前のページの最後の(スコア, id)を渡す。
+    """
+    if connection.vendor == 'sqlite':
+        inner = ('SELECT rowid AS blog_id, bm25(%s) AS score FROM %s WHERE %s MATCH %%s'
+                 % (SQLITE_TABLE, SQLITE_TABLE, SQLITE_TABLE))
+        params = [fts5_query(words)]
+    else:
+        # ts_rankは大きいほど関連度が高いので、符号を反転してbm25と向きを揃える
+        inner = ("SELECT blog_id, -ts_rank(body, q) AS score FROM %s, to_tsquery('simple', %%s) q "
+                 "WHERE body @@ q" % POSTGRES_TABLE)
+        params = [tsquery(words)]
+
+    sql = 'SELECT score, blog_id FROM (%s) ranked' % inner
+    if after is not None:
+        sql += ' WHERE score > %s OR (score = %s AND blog_id > %s)'
+        params += [after[0], after[0], after[1]]
+    sql += ' ORDER BY score, blog_id LIMIT %s'
+    params.append(limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def search_posts(query, per_page, cursor=None, user=None):
+    """
+    本文の全文検索。関連度順に1ページ分のポストを返す（次のページはnext_cursorで辿る）。
+    SQLiteとPostgreSQL以外では部分一致の新着順になる。
+    """
+    words = query_words(query)
+    if not words:
+        return CursorPage([], None)
+
+    queryset = Blog.objects.select_related('user')
+    if user is not None:
+        queryset = queryset.with_like_state(user)
+    if not is_supported():
+        return CursorPage(list(queryset.filter(content__icontains=query)[:per_page]), None)
+
+    after = decode_cursor(cursor) if cursor else None
+    rows = ranked_ids(words, per_page + 1, after)
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+
+    blogs = queryset.in_bulk([blog_id for _, blog_id in rows])
+    # 索引の更新と行の削除がずれていても落ちないよう、見つからないものは飛ばす
+    object_list = [blogs[blog_id] for _, blog_id in rows if blog_id in blogs]
+    next_cursor = encode_cursor(*rows[-1]) if has_next else None
+    return CursorPage(object_list, None, next_cursor=next_cursor)
+
+
+@receiver(post_save, sender=Blog)
+def blog_saved(sender, instance, raw=False, **kwargs):
+    if is_supported() and not raw:
+        index_post(instance.pk, instance.content)
+
+
+@receiver(post_delete, sender=Blog)
+def blog_deleted(sender, instance, **kwargs):
+    if is_supported():
+        unindex_post(instance.pk)
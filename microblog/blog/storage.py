@@ -0,0 +1,75 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# 内容のハッシュで保存するアップロード先（ImageFieldのupload_to）
+CONTENT_ADDRESSED_DIRS = getattr(settings, 'CONTENT_ADDRESSED_DIRS', ('anicolleblog', 'profile_pictures'))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    アップロード画像を内容のSHA-256をファイル名にして保存するストレージ。
+    同じ画像は1つしか保存されず、ファイル名が変わらない限り内容も変わらないので、
+    URLをそのままキャッシュのキーにできる（anicolleblog/ab/cd/abcd...ef.jpg）。
+    派生画像など、それ以外の場所へのファイルは渡された名前のまま保存する。
+    """
+
+    def __init__(self, *args, directories=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.directories = tuple(CONTENT_ADDRESSED_DIRS if directories is None else directories)
+
+    def is_content_addressed(self, name):
+        return posixpath.dirname(name.replace('\\', '/')) in self.directories
+
+    def hashed_name(self, name, digest):
+        """アップロード先と拡張子はそのままに、ハッシュで2階層に振り分けた名前を作る"""
+        name = name.replace('\\', '/')
+        ext = os.path.splitext(name)[1].lower()
+        return posixpath.join(posixpath.dirname(name), digest[:2], digest[2:4], digest + ext)
+
+    def get_available_name(self, name, max_length=None):
+        # 同じ名前なら同じ内容なので、連番を付けずにそのまま使う
+        if self.is_content_addressed(name):
+            return name
+        return super().get_available_name(name, max_length)
+
+    def _save(self, name, content):
+        if not self.is_content_addressed(name):
+            return super()._save(name, content)
+
+        directory = self.path(posixpath.dirname(name))
+        os.makedirs(directory, exist_ok=True)
+
+        # 一時ファイルに書き込みながらハッシュを計算し、最後に最終的な名前へ移す
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    tmp.write(chunk)
+
+            name = self.hashed_name(name, digest.hexdigest())
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                # 保存済みの画像なので書き込まない。参照が0の画像を消すsweep_mediaが
+                # 使われたばかりだと分かるよう、更新日時だけ新しくする
+                os.remove(tmp_path)
+                os.utime(full_path)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                # mkstempのファイルは0600なので、通常の保存と同じ権限にしておく
+                os.chmod(tmp_path, self.file_permissions_mode or 0o644)
+                os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return name
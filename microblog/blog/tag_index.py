@@ -0,0 +1,128 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from blog.models import Tag, tag_key
+from blog.tagging import tags_changed
+
+# 他のプロセスでの変更はシグナルが届かないので、この秒数が経ったら読み込み直す
+TAG_INDEX_MAX_AGE = getattr(settings, 'TAG_INDEX_MAX_AGE', 300)
+# キーの範囲の上限（前方一致の終わり）
+MAX_CHAR = '\U0010ffff'
+
+
+class TagPrefixIndex:
+    """
+    タグのキーをソートした配列で持ち、前方一致の範囲を二分探索で引くプロセス内の索引。
+    初めて検索したときにタグをまとめて読み込み、以降はシグナルで更新する。
+    """
+
+    def __init__(self, max_age=None):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._keys = None  # ソート済みのキー。Noneはまだ読み込んでいない
+        self._tags = {}  # キー -> [表示名, ポスト数, id]
+        self._ids = {}  # id -> キー
+        self._loaded_at = 0
+
+    def _load(self):
+        rows = Tag.objects.values_list('key', 'name', 'post_count', 'id')
+        tags = {key: [name, post_count, tag_id] for key, name, post_count, tag_id in rows}
+        with self._lock:
+            self._tags = tags
+            self._ids = {tag[2]: key for key, tag in tags.items()}
+            self._keys = sorted(tags)
+            self._loaded_at = time.monotonic()
+
+    def _ensure_loaded(self):
+        if self._keys is None or (self.max_age is not None and time.monotonic() - self._loaded_at > self.max_age):
+            self._load()
+
+    def search(self, prefix, limit=10):
+        """prefixで始まるタグを、ポスト数の多い順に(表示名, ポスト数)で返す"""
+        prefix = tag_key(prefix)
+        if not prefix:
+            return []
+        self._ensure_loaded()
+        with self._lock:
+            start = bisect_left(self._keys, prefix)
+            end = bisect_left(self._keys, prefix + MAX_CHAR, start)
+            matches = [self._tags[key] for key in self._keys[start:end]]
+        return [(name, post_count) for name, post_count, _ in heapq.nlargest(limit, matches, key=lambda tag: tag[1])]
+
+    def put(self, tag_id, key, name, post_count):
+        with self._lock:
+            if self._keys is None:
+                return
+            old_key = self._ids.get(tag_id)
+            if old_key is not None and old_key != key:
+                self._remove(old_key)
+            if key not in self._tags:
+                insort(self._keys, key)
+            self._tags[key] = [name, post_count, tag_id]
+            self._ids[tag_id] = key
+
+    def discard(self, tag_id):
+        with self._lock:
+            key = self._ids.pop(tag_id, None)
+            if self._keys is not None and key is not None:
+                self._remove(key)
+
+    def _remove(self, key):
+        self._tags.pop(key, None)
+        index = bisect_left(self._keys, key)
+        if index < len(self._keys) and self._keys[index] == key:
+            del self._keys[index]
+
+    def change_counts(self, tag_ids, delta):
+        """ポスト数を増減する。まだ索引に無いタグ（bulk_createされたもの）はidを返す"""
+        missing = []
+        with self._lock:
+            if self._keys is None:
+                return missing
+            for tag_id in tag_ids:
+                key = self._ids.get(tag_id)
+                if key is None:
+                    missing.append(tag_id)
+                else:
+                    self._tags[key][1] += delta
+        return missing
+
+    def clear(self):
+        with self._lock:
+            self._keys = None
+            self._tags = {}
+            self._ids = {}
+
+
+tag_index = TagPrefixIndex(TAG_INDEX_MAX_AGE)
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, **kwargs):
+    transaction.on_commit(lambda: tag_index.put(instance.pk, instance.key, instance.name, instance.post_count))
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    tag_id = instance.pk
+    transaction.on_commit(lambda: tag_index.discard(tag_id))
+
+
+@receiver(tags_changed)
+def tag_counts_changed(sender, tag_ids, delta, **kwargs):
+    def apply():
+        missing = tag_index.change_counts(tag_ids, delta)
+        if not missing:
+            return
+        # bulk_createで作られたタグはpost_saveが来ないので、ここで読み込む
+        for tag_id, key, name, post_count in Tag.objects.filter(id__in=missing).values_list(
+                'id', 'key', 'name', 'post_count'):
+            tag_index.put(tag_id, key, name, post_count)
+    transaction.on_commit(apply)
@@ -0,0 +1,157 @@
+import heapq
+from collections import namedtuple
+
+from django.db.models import Q
+
+from blog.models import Blog, BlogTag, Tag, tag_key
+from blog.pagination import CursorPage, CursorPaginator
+
+# タグ式の演算子。a+bはAND、a|bはOR（+が|より強い: a+b|cは(a+b)|c）
+AND = '+'
+OR = '|'
+# ANDで最小のリストを読み進める単位。他のタグに絞られて減る分を見込んで1ページより多めに読む
+AND_CHUNK_SIZE = 200
+# 式に書けるタグの数の上限。タグごとにクエリを発行するので、長い式1つで大量のクエリにならないようにする
+MAX_TAG_TERMS = 8
+
+# ポスティングリストの1要素。ポストの投稿日時とid（カーソルにもこのまま使う）
+Posting = namedtuple('Posting', ['posted_date', 'pk'])
+
+
+def parse_tag_expression(text):
+    """
+    タグ式をORでつないだANDのグループ（名前のリストのリスト）にする。
+    演算子を含まなければNone、タグの数がMAX_TAG_TERMSを超えれば空のリスト。
+    """
+    if AND not in text and OR not in text:
+        return None
+    if sum(part.count(AND) + 1 for part in text.split(OR)) > MAX_TAG_TERMS:
+        return []
+    groups = {}
+    for part in text.split(OR):
+        names = {}
+        for name in part.split(AND):
+            if name.strip():
+                names.setdefault(tag_key(name), name.strip())
+        # 同じタグの組み合わせのグループは1つにする
+        if names:
+            groups.setdefault(frozenset(names), list(names.values()))
+    return list(groups.values())
+
+
+def expression_keys(text):
+    """タグ式に出てくるタグのキー（式そのものが1つのタグ名の場合も含める）"""
+    keys = [tag_key(text)]
+    for names in parse_tag_expression(text) or []:
+        keys.extend(tag_key(name) for name in names)
+    return list(dict.fromkeys(keys))
+
+
+def resolve_tag_groups(groups):
+    """
+    名前のグループをタグのグループにする。ANDは件数の少ないタグから並べ、
+    存在しないタグやポストの無いタグを含むANDのグループは結果が空なので落とす。
+    """
+    tags = Tag.objects.in_bulk([tag_key(name) for names in groups for name in names], field_name='key')
+    resolved = []
+    for names in groups:
+        group = [tags.get(tag_key(name)) for name in names]
+        if all(tag is not None and tag.post_count > 0 for tag in group):
+            resolved.append(sorted(group, key=lambda tag: tag.post_count))
+    return resolved
+
+
+def posting_list(tag_id, after, forward, chunk_size):
+    """
+    タグのポスティングリストを(tag, posted_date, blog)のインデックスの順に、chunk_sizeずつ読んで返す。
+    forwardなら新しい順にafterより古いもの、そうでなければ古い順にafterより新しいもの。
+    """
+    lookup = 'lt' if forward else 'gt'
+    prefix = '-' if forward else ''
+    queryset = BlogTag.objects.filter(tag_id=tag_id).order_by(prefix + 'posted_date', prefix + 'blog_id')
+    while True:
+        rows = queryset
+        if after is not None:
+            rows = rows.filter(Q(**{'posted_date__' + lookup: after.posted_date}) |
+                               Q(posted_date=after.posted_date, **{'blog_id__' + lookup: after.pk}))
+        rows = [Posting(*row) for row in rows.values_list('posted_date', 'blog_id')[:chunk_size]]
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        after = rows[-1]
+
+
+def intersection(tags, after, forward, chunk_size):
+    """
+    ANDのグループのポスティングリストの共通部分。
+    最小のリストを読み進め、候補を件数の少ない順に他のタグの(blog, tag)インデックスで絞り込む。
+    """
+    smallest, others = tags[0], tags[1:]
+    postings = posting_list(smallest.pk, after, forward, chunk_size)
+    while True:
+        chunk = [posting for _, posting in zip(range(chunk_size), postings)]
+        candidates = {posting.pk for posting in chunk}
+        for tag in others:
+            if not candidates:
+                break
+            candidates = set(BlogTag.objects.filter(tag=tag, blog_id__in=candidates)
+                             .values_list('blog_id', flat=True))
+        yield from (posting for posting in chunk if posting.pk in candidates)
+        if len(chunk) < chunk_size:
+            return
+
+
+def union(streams, forward):
+    """並び順の揃ったポスティングリストをマージし、複数のグループに出てくるポストは1つにする"""
+    last = None
+    for posting in heapq.merge(*streams, reverse=forward):
+        if posting != last:
+            yield posting
+            last = posting
+
+
+class TagExpressionPaginator(CursorPaginator):
+    """
+    タグ式に当てはまるポストを、タグ別タイムラインと同じ(posted_date, id)のカーソルでページングする。
+    中間テーブルを自己結合せず、タグごとのポスティングリストを積集合・和集合する。
+    """
+
+    def __init__(self, tag_groups, per_page, user):
+        super().__init__(Blog.objects.select_related('user').with_like_state(user), per_page)
+        self.tag_groups = tag_groups
+
+    def postings(self, after, forward):
+        streams = []
+        for tags in self.tag_groups:
+            if len(tags) == 1:
+                streams.append(posting_list(tags[0].pk, after, forward, self.per_page + 1))
+            else:
+                streams.append(intersection(tags, after, forward, max(AND_CHUNK_SIZE, self.per_page + 1)))
+        return union(streams, forward)
+
+    def page(self, cursor=None):
+        after = None
+        forward = True
+        if cursor:
+            direction, value, pk = self.decode_cursor(cursor)
+            after, forward = Posting(value, pk), direction == 'next'
+
+        # 1件余分に取って次ページの有無を判定する
+        rows = [posting for _, posting in zip(range(self.per_page + 1), self.postings(after, forward))]
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if not forward:
+            rows.reverse()
+
+        if forward:
+            has_next, has_previous = has_more, after is not None
+        else:
+            has_next, has_previous = True, has_more
+
+        next_cursor = self.encode_cursor(rows[-1], 'next') if rows and has_next else None
+        previous_cursor = self.encode_cursor(rows[0], 'prev') if rows and has_previous else None
+
+        blogs = self.queryset.in_bulk([posting.pk for posting in rows])
+        object_list = [blogs[posting.pk] for posting in rows if posting.pk in blogs]
+        return CursorPage(object_list, self, next_cursor, previous_cursor)
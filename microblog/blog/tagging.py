@@ -0,0 +1,199 @@
+import re
+import threading
+from collections import OrderedDict
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, pre_delete
+from django.dispatch import Signal, receiver
+
+from blog.models import Blog, BlogTag, Tag, tag_key
+
+# タグ入力の区切り文字（全角半角カンマ）
+TAG_SEPARATOR = re.compile("[,、]")
+
+# タグの付け外しでポスト数が変わったときに送る（bulk_createなどm2m_changedが来ない操作も含む）
+tags_changed = Signal(providing_args=['tag_ids', 'delta', 'blog_ids'])
+
+
+def normalize_tag_name(name):
+    """前後の空白を除き、連続する空白を1つにまとめる"""
+    return " ".join(name.split())
+
+
+def split_tag_names(text):
+    """タグ入力文字列を正規化済みのタグ名リストにする（同じキーになるものと空は除く）"""
+    names = OrderedDict()
+    for name in TAG_SEPARATOR.split(text or ""):
+        name = normalize_tag_name(name)
+        if name:
+            names.setdefault(tag_key(name), name)
+    return list(names.values())
+
+
+class TagIdCache:
+    """タグのキー→idの上限付きLRUキャッシュ（プロセス内）"""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    found[key] = self._data[key]
+        return found
+
+    def set_many(self, mapping):
+        with self._lock:
+            for key, tag_id in mapping.items():
+                self._data[key] = tag_id
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def discard_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+tag_id_cache = TagIdCache()
+
+
+@receiver(post_delete, sender=Tag)
+def discard_deleted_tag(sender, instance, **kwargs):
+    """削除されたタグのidをキャッシュに残さない"""
+    tag_id_cache.discard(instance.key)
+
+
+def resolve_tag_ids(names):
+    """
+    タグ名のリストを {タグ名: id} にする。
+    既存タグはキーでまとめて1クエリで引き、無いものだけbulk_createする。
+    """
+    keys = {name: tag_key(name) for name in names}
+    resolved = tag_id_cache.get_many(keys.values())
+    missing = {key: name for name, key in keys.items() if key not in resolved}
+
+    if missing:
+        found = dict(Tag.objects.filter(key__in=missing).values_list('key', 'id'))
+        new_tags = [Tag(name=name, key=key) for key, name in missing.items() if key not in found]
+
+        if new_tags:
+            # 同時に同じタグが作られてもユニーク制約で1件にまとまる
+            Tag.objects.bulk_create(new_tags, ignore_conflicts=True)
+            # SQLiteではbulk_createでpkが返らないので引き直す
+            found.update(Tag.objects.filter(key__in=[tag.key for tag in new_tags]).values_list('key', 'id'))
+
+        # ロールバックされると存在しないidになるので、コミットされてから覚える
+        transaction.on_commit(lambda: tag_id_cache.set_many(found))
+        resolved.update(found)
+
+    return {name: resolved[key] for name, key in keys.items()}
+
+
+def _change_post_count(tag_ids, delta, blog_ids):
+    """タグのポスト数をDB側で増減する。blog_idsはタグが付け外しされたポスト"""
+    if tag_ids:
+        Tag.objects.filter(id__in=tag_ids).update(post_count=F('post_count') + delta)
+        tags_changed.send(sender=Tag, tag_ids=list(tag_ids), delta=delta, blog_ids=list(blog_ids))
+
+
+def _ordered_tag_ids(names):
+    """タグ名の並び順のまま、重複のないタグidのリストを返す"""
+    tag_ids = resolve_tag_ids(names)
+    return list(OrderedDict.fromkeys(tag_ids[name] for name in names))
+
+
+def _count_up(names, exclude=()):
+    """
+    タグ名をidにし、exclude以外のタグのポスト数を1増やす。(タグidのリスト, 増やしたidのリスト)を返す。
+    キャッシュのidが存在しないタグ（他のプロセスで削除されたものなど）を指していれば、UPDATEの件数で
+    分かるので、増やした分を戻してキャッシュを使わずに引き直す。
+    """
+    for _ in range(2):
+        tag_ids = _ordered_tag_ids(names)
+        added = [tag_id for tag_id in tag_ids if tag_id not in exclude]
+        if not added or Tag.objects.filter(id__in=added).update(post_count=F('post_count') + 1) == len(added):
+            return tag_ids, added
+        Tag.objects.filter(id__in=added).update(post_count=F('post_count') - 1)
+        tag_id_cache.discard_many(tag_key(name) for name in names)
+    raise Tag.DoesNotExist('タグが同時に削除されました')
+
+
+@transaction.atomic
+def add_tags(blog, names):
+    """ポストにタグを付ける（中間テーブルへのINSERTは1回）"""
+    if not names:
+        return
+    _, tag_ids = _count_up(names)
+    BlogTag.objects.bulk_create([
+        BlogTag(blog=blog, tag_id=tag_id, posted_date=blog.posted_date) for tag_id in tag_ids
+    ])
+    tags_changed.send(sender=Tag, tag_ids=tag_ids, delta=1, blog_ids=[blog.pk])
+
+
+@transaction.atomic
+def sync_tags(blog, names):
+    """ポストのタグを names に揃える。差分だけを削除・追加する"""
+    current = set(BlogTag.objects.filter(blog=blog).values_list('tag_id', flat=True))
+    tag_ids, added = _count_up(names, exclude=current)
+
+    removed = current.difference(tag_ids)
+    if removed:
+        BlogTag.objects.filter(blog=blog, tag_id__in=removed).delete()
+        _change_post_count(removed, -1, [blog.pk])
+
+    if added:
+        BlogTag.objects.bulk_create([
+            BlogTag(blog=blog, tag_id=tag_id, posted_date=blog.posted_date) for tag_id in added
+        ])
+        tags_changed.send(sender=Tag, tag_ids=added, delta=1, blog_ids=[blog.pk])
+
+
+@receiver(m2m_changed, sender=BlogTag)
+def update_post_count(sender, instance, action, reverse, pk_set, **kwargs):
+    """blog.tag.add()などマネージャー経由の付け外しでもポスト数を合わせる"""
+    # reverse=Trueはtag.blog_set側からの操作で、pk_setはポストのidになる
+    if action == 'post_add':
+        if reverse:
+            Tag.objects.filter(pk=instance.pk).update(post_count=F('post_count') + len(pk_set))
+            tags_changed.send(sender=Tag, tag_ids=[instance.pk], delta=len(pk_set), blog_ids=list(pk_set))
+        else:
+            _change_post_count(pk_set, 1, [instance.pk])
+        return
+
+    if action not in ('pre_remove', 'pre_clear'):
+        return
+
+    # 実際に消える行だけを数える
+    rows = BlogTag.objects.filter(tag=instance) if reverse else BlogTag.objects.filter(blog=instance)
+    if action == 'pre_remove':
+        rows = rows.filter(**{'blog_id__in' if reverse else 'tag_id__in': pk_set})
+
+    if reverse:
+        blog_ids = list(rows.values_list('blog_id', flat=True))
+        Tag.objects.filter(pk=instance.pk).update(post_count=F('post_count') - len(blog_ids))
+        tags_changed.send(sender=Tag, tag_ids=[instance.pk], delta=-len(blog_ids), blog_ids=blog_ids)
+    else:
+        _change_post_count(list(rows.values_list('tag_id', flat=True)), -1, [instance.pk])
+
+
+@receiver(pre_delete, sender=Blog)
+def release_post_count(sender, instance, **kwargs):
+    """ポスト削除時、付いていたタグのポスト数を減らす"""
+    tag_ids = list(BlogTag.objects.filter(blog=instance).values_list('tag_id', flat=True))
+    _change_post_count(tag_ids, -1, [instance.pk])
@@ -0,0 +1,11 @@
+from django import template
+
+from blog.post_cards import render_post_card
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_card(blog, template_name='blog/includes/post_card.html'):
+    """{% post_card blog %} でキャッシュ済みのポストのカードを出力する"""
+    return render_post_card(blog, template_name)
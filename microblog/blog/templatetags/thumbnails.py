@@ -0,0 +1,27 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from blog.thumbnails import THUMBNAIL_FORMATS, available_widths, derivative_name
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(image, css_class='img-responsive', sizes='100vw'):
+    """
+    派生画像があればsrcset付きの<picture>を出力する。
+    まだ作成されていなければ元画像の<img>を出力する。
+    """
+    widths = available_widths(image.name, image.storage)
+    if not widths:
+        return format_html('<img src="{}" class="{}">', image.url, css_class)
+
+    def srcset(ext):
+        return ', '.join('%s %dw' % (image.storage.url(derivative_name(image.name, width, ext)), width)
+                         for width in widths)
+
+    sources = format_html_join(
+        '', '<source type="image/{}" srcset="{}" sizes="{}">',
+        ((ext, srcset(ext), sizes) for ext, _, _ in THUMBNAIL_FORMATS if ext != 'jpg'))
+    return format_html('<picture>{}<img src="{}" srcset="{}" sizes="{}" class="{}"></picture>',
+                       sources, image.url, srcset('jpg'), sizes, css_class)
@@ -0,0 +1,98 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from blog.anime_catalog import AnimeCatalogClient, AnimeCatalogError
+
+
+class StubAnimeApi(BaseHTTPRequestHandler):
+    """api.moemoe.tokyoの代わりにローカルで応答するスタブ"""
+    hits = []
+    delay = 0
+
+    def do_GET(self):
+        self.hits.append(self.path)
+        time.sleep(self.delay)
+        # /anime/v1/master/<year>[/<cours>]
+        parts = self.path.strip('/').split('/')[3:]
+        body = json.dumps([{'id': int(''.join(parts)), 'title': 'anime %s' % '-'.join(parts),
+                            'fetched': len(self.hits)}]).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+
+    def handle_error(self, request, client_address):
+        # タイムアウトのテストでクライアントが先に切断するのは想定どおり
+        pass
+
+
+class AnimeCatalogClientTest(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = StubServer(('127.0.0.1', 0), StubAnimeApi)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.endpoint = 'http://127.0.0.1:%d/anime/v1/master' % cls.server.server_address[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        StubAnimeApi.hits = []
+        StubAnimeApi.delay = 0
+        self.now = 1000.0
+        self.client_ = AnimeCatalogClient(self.endpoint, ttl=60, stale_ttl=600, timeout=(1, 0.5),
+                                          concurrency=4, clock=lambda: self.now)
+
+    def test_cached_per_season(self):
+        """同じ(year, cours)は2回目からAPIを呼ばないことを検証"""
+        first = self.client_.fetch(2019, 1)
+        self.assertEqual(self.client_.fetch('2019', '1'), first)
+        self.assertEqual(first[0]['title'], 'anime 2019-1')
+        self.client_.fetch(2019)
+        self.assertEqual(StubAnimeApi.hits, ['/anime/v1/master/2019/1', '/anime/v1/master/2019'])
+
+    def test_stale_while_revalidate(self):
+        """期限切れ後は古い値をすぐ返し、裏で取り直すことを検証"""
+        first = self.client_.fetch(2019, 2)
+        self.now += 61
+        self.assertEqual(self.client_.fetch(2019, 2), first)
+
+        # 裏での取り直しが終わるのを待つ
+        deadline = time.time() + 5
+        while self.client_._refreshing and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertNotEqual(self.client_.fetch(2019, 2), first)
+        self.assertEqual(len(StubAnimeApi.hits), 2)
+
+    def test_timeout(self):
+        """APIが遅ければタイムアウトしてAnimeCatalogErrorになることを検証"""
+        StubAnimeApi.delay = 1
+        with self.assertRaises(AnimeCatalogError):
+            self.client_.fetch(2020, 3)
+
+    def test_fetch_year_concurrently(self):
+        """4クールを並行して取得し、1つのリストにまとめることを検証"""
+        StubAnimeApi.delay = 0.3
+        started = time.time()
+        anime_list = self.client_.fetch_year(2018)
+        self.assertLess(time.time() - started, 0.9)
+        self.assertEqual(sorted(hit.rsplit('/', 1)[1] for hit in StubAnimeApi.hits), ['1', '2', '3', '4'])
+        self.assertEqual(len(anime_list), 4)
+        self.assertEqual([anime['id'] for anime in anime_list], sorted(anime['id'] for anime in anime_list))
@@ -0,0 +1,55 @@
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from blog.models import Anime
+
+
+class SyncAnimeTest(TestCase):
+
+    def fake_request(self, year, cours=None):
+        return self.seasons.get((year, cours), [])
+
+    def sync(self):
+        with mock.patch('blog.anime_catalog.anime_catalog.request', side_effect=self.fake_request):
+            call_command('sync_anime', year_from=2019, year_to=2019, stdout=mock.Mock())
+
+    def test_sync(self):
+        """追加・更新・削除がクールごとに反映されることを検証"""
+        self.seasons = {
+            (2019, 1): [{'id': 1, 'title': 'A'}, {'id': 2, 'title': 'B'}],
+            (2019, 2): [{'id': 3, 'title': 'C', 'public_url': 'http://example.com'}],
+        }
+        self.sync()
+        self.assertEqual(list(Anime.objects.values_list('title', 'cours')), [('A', 1), ('B', 1), ('C', 2)])
+
+        self.seasons[(2019, 1)] = [{'id': 1, 'title': 'A2'}]
+        self.sync()
+        self.assertEqual(list(Anime.objects.values_list('title', flat=True)), ['A2', 'C'])
+
+
+class AnimeSearchViewTest(TestCase):
+
+    def setUp(self):
+        for i in range(15):
+            Anime.objects.create(api_id=i, title='anime%02d' % i, year=2019, cours=1 + i % 2)
+
+    def test_search_from_local_table(self):
+        """外部APIを呼ばずにローカルのテーブルをページングすることを検証"""
+        with mock.patch('blog.anime_catalog.AnimeCatalogClient.request') as request:
+            response = self.client.post(reverse('search'), {'year': '2019', 'cours': ''})
+            self.assertEqual(len(response.context['anime_list']), 10)
+
+            response = self.client.get(reverse('search'), {'year': '2019', 'cours': '2', 'page': '1'})
+            self.assertEqual([a.title for a in response.context['anime_list']][:2], ['anime01', 'anime03'])
+            self.assertEqual(response.context['page_obj'].paginator.count, 7)
+        request.assert_not_called()
+
+    def test_two_cours_listed_once(self):
+        """2クールにまたがる作品は、年だけで探したときに1回だけ出ることを検証"""
+        Anime.objects.create(api_id=0, title='anime00', year=2019, cours=2)
+        response = self.client.get(reverse('search'), {'year': '2019', 'cours': '', 'page': '1'})
+        self.assertEqual(response.context['page_obj'].paginator.count, 15)
+        response = self.client.get(reverse('search'), {'year': '2019', 'cours': '2', 'page': '1'})
+        self.assertEqual(response.context['anime_list'][0].title, 'anime00')
@@ -0,0 +1,33 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from blog.models import Blog, Like, User
+
+
+class ReconcileLikeCountsTest(TestCase):
+
+    def setUp(self):
+        self.users = [User.objects.create_user('u%d@example.com' % i, 'password', nick_name='u%d' % i)
+                      for i in range(3)]
+        self.blogs = [Blog.objects.create(content='post%d' % i, user=self.users[0]) for i in range(5)]
+        for user in self.users:
+            Like.objects.create(user=user, post=self.blogs[0])
+        Like.objects.create(user=self.users[0], post=self.blogs[1])
+        Blog.objects.filter(pk=self.blogs[0].pk).update(like_num=1)
+        Blog.objects.filter(pk=self.blogs[2].pk).update(like_num=4)
+
+    def like_nums(self):
+        return list(Blog.objects.order_by('id').values_list('like_num', flat=True))
+
+    def test_reconcile(self):
+        """ずれたいいね数をチャンクごとに直すことを検証"""
+        out = StringIO()
+        call_command('reconcile_like_counts', chunk_size=2, stdout=out)
+        self.assertEqual(self.like_nums(), [3, 1, 0, 0, 0])
+        self.assertIn('5件中3件', out.getvalue())
+
+    def test_dry_run(self):
+        """--dry-runでは修正しないことを検証"""
+        call_command('reconcile_like_counts', dry_run=True, stdout=StringIO())
+        self.assertEqual(self.like_nums(), [1, 0, 4, 0, 0])
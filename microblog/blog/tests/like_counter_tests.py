@@ -0,0 +1,34 @@
+from django.test import TestCase
+from blog.like_counter import LikeCounterBuffer
+from blog.models import Blog, User
+
+
+class LikeCounterBufferTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('counter@example.com', 'password', nick_name='counter')
+        self.blogs = [Blog.objects.create(content='post%d' % i, user=self.user) for i in range(3)]
+        self.buffer = LikeCounterBuffer()
+
+    def like_nums(self):
+        return [Blog.objects.get(pk=blog.pk).like_num for blog in self.blogs]
+
+    def test_buffered_value_before_flush(self):
+        """書き込み前でも溜めた増減を含めた件数を返すことを検証"""
+        for _ in range(3):
+            self.buffer.add(self.blogs[0].pk, 1)
+        self.buffer.add(self.blogs[0].pk, -1)
+        self.assertEqual(self.buffer.like_num(self.blogs[0].pk), 2)
+        self.assertEqual(self.like_nums(), [0, 0, 0])
+
+    def test_flush_batches_updates(self):
+        """増減値ごとに1回のUPDATEでまとめて書き込むことを検証"""
+        self.buffer.add(self.blogs[0].pk, 1)
+        self.buffer.add(self.blogs[1].pk, 1)
+        self.buffer.add(self.blogs[2].pk, 1)
+        self.buffer.add(self.blogs[2].pk, 1)
+        # UPDATE 2回（+ SAVEPOINT 2回）
+        with self.assertNumQueries(4):
+            self.buffer.flush()
+        self.assertEqual(self.like_nums(), [1, 1, 2])
+        self.assertEqual(self.buffer.pending(self.blogs[2].pk), 0)
@@ -0,0 +1,156 @@
+import warnings
+
+from django.contrib import messages
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.test import TransactionTestCase
+from django.urls import reverse
+from blog.models import Blog, Comment, Like, User
+
+
+class AnonymousPageCacheTest(TransactionTestCase):
+    # キャッシュはコミット後に捨てるので、トランザクションで包まない
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('page@example.com', 'password', nick_name='page')
+        self.blog = Blog.objects.create(content='cached', user=self.user)
+
+    def test_detail_cached_until_comment(self):
+        """匿名ユーザーには描画済みのページを返し、コメントが付いたら描画し直すことを検証"""
+        url = reverse('detail', args=[self.blog.pk])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, 'cached')
+        self.assertNotIn('csrftoken', response.cookies)
+
+        Comment.objects.create(content='new comment', post=self.blog)
+        self.assertContains(self.client.get(url), 'new comment')
+
+    def test_timeline_dropped_on_like(self):
+        """いいねが付いたらタイムラインと投稿者のプロフィールを描画し直すことを検証"""
+        urls = [reverse('index'), reverse('profile_detail', args=['page'])]
+        for url in urls:
+            self.assertContains(self.client.get(url), '0 いいね')
+
+        Like.objects.create(user=self.user, post=self.blog)
+        Blog.objects.filter(pk=self.blog.pk).update(like_num=1)
+        for url in urls:
+            self.assertContains(self.client.get(url), '1 いいね')
+
+    def test_profile_stats_not_stale(self):
+        """期限なしで保存するプロフィールには、集計のキャッシュの古い値を使わないことを検証"""
+        url = reverse('profile_detail', args=['page'])
+        self.assertContains(self.client.get(url), 'もらったいいね 0')
+
+        Like.objects.create(user=self.user, post=self.blog)
+        Blog.objects.filter(pk=self.blog.pk).update(like_num=1)
+        self.assertContains(self.client.get(url), 'もらったいいね 1')
+
+    def test_unknown_params_share_entry(self):
+        """ビューが読まないクエリパラメータではキャッシュもETagも分けないことを検証"""
+        url = reverse('index')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'utm_source': 'x'})
+        self.assertEqual(response['ETag'], etag)
+        self.assertNotEqual(self.client.get(url, {'cursor': 'x'})['ETag'], etag)
+
+    def test_logged_in_not_cached(self):
+        """ログイン中のリクエストはキャッシュを使わないことを検証"""
+        url = reverse('detail', args=[self.blog.pk])
+        self.client.get(url)
+        self.client.force_login(self.user)
+        response = self.client.get(url)
+        self.assertContains(response, '編集')
+
+    def test_profile_dropped_on_edit(self):
+        """プロフィールを編集したらプロフィールのページを描画し直すことを検証"""
+        url = reverse('profile_detail', args=['page'])
+        self.assertNotContains(self.client.get(url), 'new bio')
+        profile = self.user.profile
+        profile.bio = 'new bio'
+        profile.save()
+        self.assertContains(self.client.get(url), 'new bio')
+
+    def test_key_for_any_name(self):
+        """空白や日本語を含むタグ・ニックネームでも、memcachedで使えないキーにならないことを検証"""
+        self.user.nick_name = 'ページ 太郎'
+        self.user.save()
+        Blog.objects.create(content='tagged', user=self.user).tag.create(name='フリクリ オルタナ')
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            self.assertContains(self.client.get(reverse('profile_detail', args=['ページ 太郎'])), 'cached')
+            self.assertContains(self.client.get(reverse('tag_seach', args=['フリクリ オルタナ'])), 'tagged')
+
+    def test_messages_not_cached(self):
+        """メッセージを出したページは他の人に返さないことを検証"""
+        url = reverse('tag_seach', args=['なし'])
+        response = self.client.get(url)
+        self.assertEqual([m.message for m in messages.get_messages(response.wsgi_request)],
+                         ['タグに「なし」がつく投稿はありません'])
+        self.client.cookies.clear()
+        response = self.client.get(url)
+        self.assertIsNotNone(response.context)
+
+
+class ConditionalGetTest(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('etag@example.com', 'password', nick_name='etag')
+        self.blog = Blog.objects.create(content='etag', user=self.user)
+
+    def test_not_modified_until_changed(self):
+        """変更が無ければページのデータを読まずに304を返し、コメントが付いたら200を返すことを検証"""
+        self.client.force_login(self.user)
+        url = reverse('detail', args=[self.blog.pk])
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(3):  # セッション、ユーザー、ポストとコメントの集計
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Comment.objects.create(content='new comment', post=self.blog)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_depends_on_viewer(self):
+        """ログインしているユーザーが違えば別のETagになることを検証"""
+        url = reverse('index')
+        anonymous = self.client.get(url)['ETag']
+        self.client.force_login(self.user)
+        self.assertNotEqual(self.client.get(url, HTTP_IF_NONE_MATCH=anonymous).status_code, 304)
+
+    def test_etag_depends_on_csrf_cookie(self):
+        """ログインし直してCSRFトークンが変わったら304を返さないことを検証"""
+        self.client.force_login(self.user)
+        url = reverse('detail', args=[self.blog.pk])
+        etag = self.client.get(url)['ETag']
+        self.client.logout()
+        self.client.force_login(self.user)
+        self.client.cookies['csrftoken'] = 'x' * 32
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_from_database(self):
+        """キャッシュを持っていないワーカーでも同じETagになり、別のワーカーでの変更で変わることを検証"""
+        url = reverse('index')
+        etag = self.client.get(url)['ETag']
+        cache.clear()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.user.nick_name = 'renamed'
+        self.user.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'renamed')
+
+    def test_cached_page_not_modified(self):
+        """キャッシュしたページも保存時のETagで304を返すことを検証"""
+        url = reverse('detail', args=[self.blog.pk])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
@@ -0,0 +1,62 @@
+import base64
+import json
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from blog.models import Blog, User
+from blog.pagination import CursorPaginator
+
+
+class CursorPaginatorTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('cursor@example.com', 'password', nick_name='cursor')
+        for i in range(25):
+            Blog.objects.create(content='post%d' % i, user=self.user)
+        # posted_dateが同じ投稿があってもidで順序が決まることを確認するため揃える
+        Blog.objects.update(posted_date=timezone.now())
+
+    def test_walk_forward_and_back(self):
+        """次ページ・前ページを辿っても重複や欠落がないことを検証"""
+        paginator = CursorPaginator(Blog.objects.all(), 10)
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+
+        ids = [blog.id for page in pages for blog in page]
+        expected = list(Blog.objects.order_by('-posted_date', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertFalse(pages[0].has_previous())
+
+        back = paginator.page(pages[2].previous_cursor)
+        self.assertEqual(list(back), list(pages[1]))
+        self.assertTrue(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_no_count_query(self):
+        """ページ取得が1クエリで済むことを検証"""
+        paginator = CursorPaginator(Blog.objects.all(), 10)
+        cursor = paginator.page().next_cursor
+        with self.assertNumQueries(1):
+            paginator.page(cursor)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        """壊れたカーソルは先頭ページとして扱うことを検証"""
+        response = self.client.get(reverse('index'), {'cursor': 'broken!!'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['page_obj'].has_previous())
+        self.assertEqual(len(response.context['blog_list']), 10)
+
+    def test_crafted_cursor_falls_back_to_first_page(self):
+        """日時として読めない値や範囲外のpkを含むカーソルも先頭ページとして扱うことを検証"""
+        now = timezone.now().isoformat()
+        for raw in (['next', 'notadate', 1], ['next', now, 10 ** 30]):
+            cursor = base64.urlsafe_b64encode(json.dumps(raw).encode()).decode().rstrip('=')
+            response = self.client.get(reverse('index'), {'cursor': cursor})
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.context['page_obj'].has_previous())
+            self.assertEqual(len(response.context['blog_list']), 10)
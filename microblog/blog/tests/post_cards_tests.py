@@ -0,0 +1,55 @@
+from django.core.cache import cache
+from django.test import TransactionTestCase
+from blog.cache_versions import version_key
+from blog.models import Blog, User
+from blog.post_cards import render_post_card
+from blog.thumbnails import cache_key
+
+
+class PostCardTest(TransactionTestCase):
+    # バージョンはコミット後に振り直すので、トランザクションで包まない
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('card@example.com', 'password', nick_name='card')
+        self.blog = Blog.objects.create(content='first', user=self.user)
+
+    def render(self):
+        blog = Blog.objects.select_related('user').get(pk=self.blog.pk)
+        return render_post_card(blog, 'blog/includes/post_card.html')
+
+    def test_cached_until_post_saved(self):
+        """シグナルが来るまでは描画済みのカードを使い、保存されたら描画し直すことを検証"""
+        self.assertIn('first', self.render())
+        # シグナルを送らない更新ではキャッシュが使われる
+        Blog.objects.filter(pk=self.blog.pk).update(content='second')
+        self.assertIn('first', self.render())
+
+        self.blog.content = 'third'
+        self.blog.save()
+        self.assertIn('third', self.render())
+
+    def test_nick_name_change(self):
+        """ニックネームを変えたら投稿者のカードを描画し直すことを検証"""
+        self.assertIn('@card', self.render())
+        self.user.nick_name = 'renamed'
+        self.user.save()
+        self.assertIn('@renamed', self.render())
+
+    def test_lost_version_does_not_revive_old_card(self):
+        """バージョンがキャッシュから消えても古いカードを使わないことを検証"""
+        self.render()
+        Blog.objects.filter(pk=self.blog.pk).update(content='second')
+        cache.delete(version_key('post_card:blog:%s' % self.blog.pk))
+        self.assertIn('second', self.render())
+
+    def test_photo_card_cached(self):
+        """作成済みの派生画像を引くだけではカードを描画し直さないことを検証"""
+        name = 'anicolleblog/card.jpg'
+        Blog.objects.filter(pk=self.blog.pk).update(photo=name)
+        cache.set(cache_key(name), [320], None)
+        blog = Blog.objects.select_related('user').get(pk=self.blog.pk)
+        html = render_post_card(blog, 'blog/includes/post_card_photo.html')
+        self.assertIn('card.jpg_320.webp', html)
+        with self.assertNumQueries(0):
+            self.assertEqual(render_post_card(blog, 'blog/includes/post_card_photo.html'), html)
@@ -0,0 +1,71 @@
+from django.test import TestCase
+from django.urls import reverse
+from blog.models import Blog, User
+from blog.search import bigrams, search_posts
+
+
+class PostSearchTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('search@example.com', 'password', nick_name='search')
+
+    def post(self, content):
+        return Blog.objects.create(content=content, user=self.user)
+
+    def test_bigrams(self):
+        """全角半角・大文字小文字を揃えて2文字ずつに区切ることを検証"""
+        self.assertEqual(bigrams('フリクリ最高！！ ＡＢ'), ['フリ', 'リク', 'クリ', 'リ最', '最高', 'ab'])
+        self.assertEqual(bigrams('a'), ['a'])
+
+    def test_substring_match(self):
+        """空白で区切られていない日本語の途中の語でも見つかり、並びの違うものは出ないことを検証"""
+        hit = self.post('フリクリ最高！！')
+        self.post('クリフリ')
+        self.post('けいおん')
+        self.assertEqual(list(search_posts('リクリ', 10)), [hit])
+        self.assertEqual(list(search_posts('最 ﾌﾘｸﾘ', 10)), [hit])
+        self.assertEqual(list(search_posts('ない', 10)), [])
+
+    def test_single_character(self):
+        """1文字の検索で、語の先頭・途中・末尾と1文字だけの語のどれも見つかることを検証"""
+        posts = [self.post('猫'), self.post('黒猫がかわいい'), self.post('うちの猫'), self.post('猫派')]
+        self.post('犬')
+        self.assertEqual(sorted(blog.pk for blog in search_posts('猫', 10)), sorted(blog.pk for blog in posts))
+
+    def test_ranked_and_paginated(self):
+        """関連度の高い順に並び、カーソルで重複なく最後まで辿れることを検証"""
+        posts = [self.post('フリクリ ' + 'x ' * i) for i in range(5)]
+        # 語の出現が多いものが上に来る
+        best = self.post('フリクリ フリクリ フリクリ')
+
+        page = search_posts('フリクリ', 2)
+        self.assertEqual(page.object_list[0], best)
+        seen = list(page)
+        while page.has_next():
+            page = search_posts('フリクリ', 2, page.next_cursor)
+            seen += list(page)
+        self.assertEqual(sorted(blog.pk for blog in seen), sorted(blog.pk for blog in posts + [best]))
+
+    def test_reindex_on_edit_and_delete(self):
+        """ポストの編集と削除が索引に反映されることを検証"""
+        blog = self.post('フリクリ')
+        blog.content = 'けいおん'
+        blog.save()
+        self.assertEqual(list(search_posts('フリクリ', 10)), [])
+        self.assertEqual(list(search_posts('けいおん', 10)), [blog])
+
+        blog.delete()
+        self.assertEqual(list(search_posts('けいおん', 10)), [])
+
+    def test_view(self):
+        """検索ページが結果と次のページへのリンクを返し、壊れたカーソルは先頭に戻ることを検証"""
+        for i in range(11):
+            self.post('フリクリ %s' % i)
+        response = self.client.get(reverse('search_posts'), {'q': 'フリクリ'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['blog_list']), 10)
+        self.assertTrue(response.context['page_obj'].has_next())
+
+        response = self.client.get(reverse('search_posts'), {'q': 'フリクリ', 'cursor': 'broken'})
+        self.assertEqual(len(response.context['blog_list']), 10)
+        self.assertContains(self.client.get(reverse('search_posts'), {'q': 'けいおん'}), '含む投稿はありません')
@@ -0,0 +1,92 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from blog.media import sweep_media
+from blog.models import Blog, MediaBlob, User
+from blog.storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTest(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.storage = ContentAddressedStorage(location=self.media_root)
+
+    def test_same_content_is_stored_once(self):
+        """同じ内容は同じハッシュ名で1つだけ保存されることを検証"""
+        digest = hashlib.sha256(b'image').hexdigest()
+        first = self.storage.save('anicolleblog/a.JPG', ContentFile(b'image'))
+        second = self.storage.save('anicolleblog/b.jpg', ContentFile(b'image'))
+
+        self.assertEqual(first, 'anicolleblog/%s/%s/%s.jpg' % (digest[:2], digest[2:4], digest))
+        self.assertEqual(first, second)
+        self.assertEqual(os.listdir(os.path.dirname(self.storage.path(first))), [digest + '.jpg'])
+
+    def test_other_directories_keep_name(self):
+        """アップロード先以外（派生画像など）は渡した名前で保存されることを検証"""
+        name = self.storage.save('anicolleblog/thumbs/a.jpg_320.webp', ContentFile(b'thumb'))
+        self.assertEqual(name, 'anicolleblog/thumbs/a.jpg_320.webp')
+
+
+class MediaRefCountTest(TransactionTestCase):
+    # 画像の削除はコミット後に行うので、トランザクションで包まない
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user('media@example.com', 'password', nick_name='media')
+        self.name = default_storage.save('anicolleblog/photo.jpg', ContentFile(b'photo'))
+
+    def test_deleted_when_unused(self):
+        """参照しているポストがすべて無くなり、猶予を過ぎたときに画像が削除されることを検証"""
+        first = Blog.objects.create(content='first', user=self.user, photo=self.name)
+        second = Blog.objects.create(content='second', user=self.user, photo=self.name)
+        self.assertEqual(MediaBlob.objects.get(name=self.name).ref_count, 2)
+
+        first.delete()
+        second.photo = None
+        second.save()
+        # 参照が0になってもすぐには消さない
+        self.assertEqual(sweep_media(grace=60), 0)
+        self.assertTrue(default_storage.exists(self.name))
+
+        self.age(self.name, 120)
+        self.assertEqual(sweep_media(grace=60), 1)
+        self.assertFalse(MediaBlob.objects.filter(name=self.name).exists())
+        self.assertFalse(default_storage.exists(self.name))
+
+    def test_reupload_kept(self):
+        """削除待ちの画像が再びアップロード・参照されたら削除しないことを検証"""
+        blog = Blog.objects.create(content='first', user=self.user, photo=self.name)
+        blog.delete()
+        self.age(self.name, 120)
+
+        # アップロードでファイルは書かれたが、まだ参照を増やしていない
+        self.assertEqual(default_storage.save('anicolleblog/again.jpg', ContentFile(b'photo')), self.name)
+        self.assertEqual(sweep_media(grace=60), 0)
+        self.assertTrue(default_storage.exists(self.name))
+
+        Blog.objects.create(content='again', user=self.user, photo=self.name)
+        self.age(self.name, 120)
+        self.assertEqual(sweep_media(grace=60), 0)
+        self.assertEqual(MediaBlob.objects.get(name=self.name).ref_count, 1)
+
+    def age(self, name, seconds):
+        """参照が0になった日時とファイルの更新日時を古くする"""
+        MediaBlob.objects.filter(name=name, released_at__isnull=False).update(
+            released_at=timezone.now() - timedelta(seconds=seconds))
+        past = time.time() - seconds
+        os.utime(default_storage.path(name), (past, past))
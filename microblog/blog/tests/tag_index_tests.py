@@ -0,0 +1,40 @@
+from django.test import TransactionTestCase
+from django.urls import reverse
+from blog.models import Blog, Tag, User
+from blog.tag_index import tag_index
+from blog.tagging import add_tags
+
+
+class TagPrefixIndexTest(TransactionTestCase):
+    # 索引はコミット後に更新するので、トランザクションで包まない
+
+    def setUp(self):
+        tag_index.clear()
+        self.addCleanup(tag_index.clear)
+        user = User.objects.create_user('index@example.com', 'password', nick_name='index')
+        for name, count in [('フリクリ', 3), ('フリップフラッパーズ', 5), ('ふらいんぐうぃっち', 1)]:
+            for i in range(count):
+                add_tags(Blog.objects.create(content=name, user=user), [name])
+        self.user = user
+
+    def test_prefix_ranked_by_usage(self):
+        """前方一致するタグをポスト数の多い順に返し、検索中はDBを引かないことを検証"""
+        tag_index.search('x')  # 読み込み
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('api_tags'), {'q': 'ﾌﾘ'})
+        self.assertEqual(response.json()['tags'], [
+            {'name': 'フリップフラッパーズ', 'post_count': 5},
+            {'name': 'フリクリ', 'post_count': 3},
+        ])
+        self.assertEqual(self.client.get(reverse('api_tags'), {'q': ''}).json()['tags'], [])
+
+    def test_kept_current_by_signals(self):
+        """タグの作成・ポスト数の変化・削除が索引に反映されることを検証"""
+        self.assertEqual(tag_index.search('フリクリ'), [('フリクリ', 3)])
+
+        blog = Blog.objects.create(content='new', user=self.user)
+        add_tags(blog, ['フリクリ', 'フリクリ オルタナ'])
+        self.assertEqual(tag_index.search('フリクリ'), [('フリクリ', 4), ('フリクリ オルタナ', 1)])
+
+        Tag.objects.get(name='フリクリ').delete()
+        self.assertEqual(tag_index.search('フリクリ'), [('フリクリ オルタナ', 1)])
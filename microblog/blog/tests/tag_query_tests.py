@@ -0,0 +1,89 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from blog.models import Blog, Tag, User
+from blog.tag_query import MAX_TAG_TERMS, parse_tag_expression
+from blog.tagging import add_tags
+
+
+class TagExpressionTest(TestCase):
+
+    def setUp(self):
+        # 匿名ユーザーのページキャッシュを前のテストから持ち越さない
+        cache.clear()
+        self.user = User.objects.create_user('expr@example.com', 'password', nick_name='expr')
+        self.posts = {}
+        for i in range(30):
+            names = ['フリクリ'] if i % 2 == 0 else []
+            if i % 3 == 0:
+                names.append('ガイナックス')
+            if i % 5 == 0:
+                names.append('けいおん')
+            blog = Blog.objects.create(content='post%d' % i, user=self.user)
+            add_tags(blog, names)
+            self.posts[i] = blog
+
+    def contents(self, tag, cursor=None):
+        response = self.client.get(reverse('tag_seach', args=[tag]), {'cursor': cursor} if cursor else {})
+        return response, [blog.content for blog in response.context['blog_list']]
+
+    def expected(self, match):
+        return ['post%d' % i for i in reversed(range(30)) if match(i)]
+
+    def test_parse(self):
+        """+がANDで|より強く、空の名前と重複を落とすことを検証"""
+        self.assertIsNone(parse_tag_expression('フリクリ'))
+        self.assertEqual(parse_tag_expression('a+b|c'), [['a', 'b'], ['c']])
+        self.assertEqual(parse_tag_expression('a+ A +|'), [['a']])
+
+    def test_and(self):
+        """ANDは全部のタグが付いたポストだけを新しい順に返すことを検証"""
+        response, contents = self.contents('フリクリ+ガイナックス+けいおん')
+        self.assertEqual(contents, self.expected(lambda i: i % 30 == 0))
+        self.assertEqual(response.context['tag_expression'], 'フリクリ+ガイナックス+けいおん')
+
+    def test_or_paginated(self):
+        """ORは重複なしでマージされ、カーソルで前後に辿れることを検証"""
+        expected = self.expected(lambda i: i % 2 == 0 or i % 5 == 0)
+        response, seen = self.contents('フリクリ|けいおん')
+        self.assertEqual(seen, expected[:10])
+        while response.context['page_obj'].has_next():
+            response, contents = self.contents('フリクリ|けいおん', response.context['page_obj'].next_cursor)
+            seen += contents
+        self.assertEqual(seen, expected)
+
+        response, contents = self.contents('フリクリ|けいおん', response.context['page_obj'].previous_cursor)
+        self.assertEqual(contents, expected[:10])
+
+    def test_and_or(self):
+        """AND同士のORと、存在しないタグを含むグループを検証"""
+        _, contents = self.contents('フリクリ+けいおん|ガイナックス+けいおん|なし+フリクリ')
+        self.assertEqual(contents, self.expected(lambda i: i % 10 == 0 or i % 15 == 0))
+
+    def test_no_self_join(self):
+        """最小のリスト（けいおん）から読み、中間テーブルを自己結合しないことを検証"""
+        # 式のタグ・タグ3つ・最小のリスト・残り2つでの絞り込み・ポスト
+        with self.assertNumQueries(6) as context:
+            self.contents('フリクリ+ガイナックス+けいおん')
+        tag_id = Tag.objects.get(name='けいおん').pk
+        self.assertIn('"blog_blog_tag"."tag_id" = %d ORDER BY' % tag_id, context.captured_queries[2]['sql'])
+        for query in context.captured_queries:
+            sql = query['sql']
+            self.assertLessEqual(sql.count('FROM "blog_blog_tag"') + sql.count('JOIN "blog_blog_tag"'), 1)
+
+    def test_unknown_expression(self):
+        """どのタグも無い式はタイムラインに戻ることを検証"""
+        response, contents = self.contents('なし+ないもの')
+        self.assertEqual(len(contents), 10)
+        self.assertNotIn('tag_expression', response.context)
+
+    def test_too_many_terms(self):
+        """タグの数が上限を超える式はタグごとのクエリを発行せず、該当なしとして扱うことを検証"""
+        expression = '|'.join(['フリクリ'] * (MAX_TAG_TERMS + 1))
+        self.assertEqual(parse_tag_expression(expression), [])
+        self.assertEqual(len(parse_tag_expression('|'.join(['フリクリ'] * MAX_TAG_TERMS))), 1)
+
+        with self.assertNumQueries(2):  # 式のタグ、タイムライン
+            response, contents = self.contents(expression)
+        self.assertNotIn('tag_expression', response.context)
+        self.assertContains(response, 'がつく投稿はありません')
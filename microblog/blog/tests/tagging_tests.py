@@ -0,0 +1,80 @@
+from django.test import TestCase
+from blog.models import Blog, Tag, User, tag_key
+from blog.tagging import add_tags, split_tag_names, sync_tags, tag_id_cache
+
+
+class TaggingTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('tagging@example.com', 'password', nick_name='tagging')
+        self.blog = Blog.objects.create(content='test', user=self.user)
+
+    def tag_names(self):
+        return sorted(self.blog.tag.values_list('name', flat=True))
+
+    def test_split_tag_names(self):
+        """全角半角カンマで区切り、空白と重複を除くことを検証"""
+        self.assertEqual(split_tag_names(" フリクリ、 鶴巻  和哉,,フリクリ ,"), ['フリクリ', '鶴巻 和哉'])
+        self.assertEqual(split_tag_names(None), [])
+
+    def test_add_tags_in_constant_queries(self):
+        """タグの数に関係なく一定のクエリ数で付けられることを検証"""
+        Tag.objects.create(name='a')
+        names = ['a', 'b', 'c', 'd', 'e']
+        # 既存タグ取得、新規タグ作成、新規タグ再取得、ポスト数更新、中間テーブル作成（+ SAVEPOINT 2回）
+        with self.assertNumQueries(7):
+            add_tags(self.blog, names)
+        self.assertEqual(self.tag_names(), names)
+        self.assertEqual(Tag.objects.count(), 5)
+
+    def test_sync_tags_sends_diff(self):
+        """更新時に差分だけが削除・追加されることを検証"""
+        add_tags(self.blog, ['a', 'b', 'c'])
+        kept = self.blog.blogtag_set.get(tag__name='a').pk
+
+        sync_tags(self.blog, ['a', 'c', 'd'])
+        self.assertEqual(self.tag_names(), ['a', 'c', 'd'])
+        self.assertEqual(self.blog.blogtag_set.get(tag__name='a').pk, kept)
+
+    def test_deleted_tag_leaves_cache(self):
+        """削除されたタグがキャッシュから消えることを検証"""
+        add_tags(self.blog, ['a'])
+        Tag.objects.get(name='a').delete()
+        add_tags(self.blog, ['a'])
+        self.assertEqual(self.tag_names(), ['a'])
+
+    def test_stale_cached_id(self):
+        """キャッシュのidのタグが無くなっていても、引き直して付けられることを検証"""
+        Tag.objects.create(name='b')
+        tag_id_cache.set_many({tag_key('a'): 99999, tag_key('b'): 99998})
+        add_tags(self.blog, ['a', 'b'])
+        self.assertEqual(self.tag_names(), ['a', 'b'])
+        self.assertEqual(list(Tag.objects.order_by('name').values_list('post_count', flat=True)), [1, 1])
+
+        other = Blog.objects.create(content='other', user=self.user)
+        tag_id_cache.set_many({tag_key('c'): 99997})
+        sync_tags(other, ['b', 'c'])
+        self.assertEqual(sorted(other.tag.values_list('name', flat=True)), ['b', 'c'])
+        self.assertEqual(tag_id_cache.get_many([tag_key('c')]), {})
+
+    def test_same_key_is_one_tag(self):
+        """全角半角・大文字小文字違いは同じタグになることを検証"""
+        add_tags(self.blog, split_tag_names('ＦＬＣＬ、flcl, Flcl'))
+        self.assertEqual(self.tag_names(), ['ＦＬＣＬ'])
+        self.assertEqual(Tag.objects.get_by_name('FLCL').name, 'ＦＬＣＬ')
+
+    def test_post_count(self):
+        """付け外しとポスト削除でポスト数が保たれることを検証"""
+        other = Blog.objects.create(content='other', user=self.user)
+        add_tags(self.blog, ['a', 'b'])
+        add_tags(other, ['a'])
+        sync_tags(self.blog, ['a', 'c'])
+        other.tag.remove(Tag.objects.get(name='a'))
+        other.tag.add(Tag.objects.get(name='c'))
+
+        counts = dict(Tag.objects.values_list('name', 'post_count'))
+        self.assertEqual(counts, {'a': 1, 'b': 0, 'c': 2})
+
+        self.blog.delete()
+        counts = dict(Tag.objects.values_list('name', 'post_count'))
+        self.assertEqual(counts, {'a': 0, 'b': 0, 'c': 1})
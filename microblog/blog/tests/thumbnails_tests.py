@@ -0,0 +1,47 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from PIL import Image
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from blog.models import Blog, User
+from blog.thumbnails import derivative_name, generate_derivatives
+
+
+class ThumbnailsTest(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.clear()
+
+        buffer = BytesIO()
+        Image.new('RGB', (1000, 500), 'red').save(buffer, 'JPEG')
+        self.name = default_storage.save('anicolleblog/photo.jpg', ContentFile(buffer.getvalue()))
+        user = User.objects.create_user('thumb@example.com', 'password', nick_name='thumb')
+        self.blog = Blog(content='photo', user=user, photo=self.name)
+
+    def render(self):
+        return Template('{% load thumbnails %}{% responsive_image blog.photo %}').render(Context({'blog': self.blog}))
+
+    def test_fallback_to_original(self):
+        """派生画像ができるまでは元画像を出力することを検証"""
+        self.assertHTMLEqual(self.render(), '<img src="/media/%s" class="img-responsive">' % self.name)
+
+    def test_derivatives_and_srcset(self):
+        """元画像より小さい横幅のWebPとJPEGを作り、srcsetに出力することを検証"""
+        self.assertEqual(generate_derivatives(self.name), [320, 640])
+        with default_storage.open(derivative_name(self.name, 640, 'webp')) as f:
+            self.assertEqual(Image.open(f).size, (640, 320))
+
+        html = self.render()
+        self.assertIn('<source type="image/webp" srcset="/media/%s 320w, /media/%s 640w"' % (
+            derivative_name(self.name, 320, 'webp'), derivative_name(self.name, 640, 'webp')), html)
+        self.assertIn('src="/media/%s"' % self.name, html)
@@ -0,0 +1,237 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from blog.models import Blog, Comment, Like, Tag, User
+
+
+class BlogByTagListTest(TestCase):
+
+    def setUp(self):
+        # 匿名ユーザーのページキャッシュを前のテストから持ち越さない
+        cache.clear()
+        self.user = User.objects.create_user('tag@example.com', 'password', nick_name='tag')
+        self.tag = Tag.objects.create(name='フリクリ')
+        for i in range(15):
+            blog = Blog.objects.create(content='post%d' % i, user=self.user)
+            if i % 2 == 0:
+                blog.tag.add(self.tag, through_defaults={'posted_date': blog.posted_date})
+
+    def test_paginated_by_tag(self):
+        """タグが付いた投稿だけが新しい順にページングされることを検証"""
+        response = self.client.get(reverse('tag_seach', args=['フリクリ']))
+        blogs = response.context['blog_list']
+        self.assertEqual(len(blogs), 8)
+        self.assertEqual([blog.content for blog in blogs][:2], ['post14', 'post12'])
+        self.assertEqual(response.context['tag'], self.tag)
+
+    def test_missing_tag_is_bounded(self):
+        """存在しないタグでも1ページ分しか返さないことを検証"""
+        response = self.client.get(reverse('tag_seach', args=['なし']))
+        self.assertEqual(len(response.context['blog_list']), 10)
+        self.assertTrue(response.context['page_obj'].has_next())
+        self.assertNotIn('tag', response.context)
+
+
+class BlogDetailViewTest(TestCase):
+
+    def setUp(self):
+        # 匿名ユーザーのページキャッシュを前のテストから持ち越さない
+        cache.clear()
+        self.user = User.objects.create_user('detail@example.com', 'password', nick_name='detail')
+        self.blog = Blog.objects.create(content='test', user=self.user)
+
+    def add_thread(self, depth):
+        parent = None
+        for i in range(depth):
+            parent = Comment.objects.create(content='comment%d' % i, post=self.blog, parent=parent)
+
+    def count_queries(self):
+        # ページキャッシュを使わずに描画させる
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('detail', args=[self.blog.pk]))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_comment_tree(self):
+        """返信がツリー状に組み立てられ、深い返信は後から読み込むことを検証"""
+        self.add_thread(3)
+        Comment.objects.create(content='root2', post=self.blog)
+        response = self.client.get(reverse('detail', args=[self.blog.pk]))
+        roots = response.context['comment_list']
+        self.assertEqual([c.content for c in roots], ['comment0', 'root2'])
+        self.assertEqual(roots[0].replies[0].content, 'comment1')
+        self.assertEqual(roots[0].replies[0].reply_count, 1)
+        self.assertNotContains(response, 'comment2')
+
+    def test_comment_pages_and_reply_previews(self):
+        """コメントはページ単位、返信は先頭数件だけ表示し、続きをAPIで取れることを検証"""
+        for i in range(25):
+            Comment.objects.create(content='root%d' % i, post=self.blog)
+        first = Comment.objects.get(content='root0')
+        for i in range(5):
+            Comment.objects.create(content='reply%d' % i, post=self.blog, parent=first)
+
+        response = self.client.get(reverse('detail', args=[self.blog.pk]))
+        roots = response.context['comment_list']
+        self.assertEqual(len(roots), 20)
+        self.assertEqual([c.content for c in roots[0].replies], ['reply0', 'reply1', 'reply2'])
+
+        page = self.client.get(reverse('api_comments', args=[self.blog.pk]),
+                               {'cursor': response.context['comment_page'].next_cursor}).json()
+        self.assertEqual([c['content'] for c in page['comments']], ['root%d' % i for i in range(20, 25)])
+        self.assertIsNone(page['next_cursor'])
+
+        replies = self.client.get(reverse('api_replies', args=[first.pk]),
+                                  {'cursor': roots[0].more_replies_cursor}).json()
+        self.assertEqual([c['content'] for c in replies['comments']], ['reply3', 'reply4'])
+
+    def test_query_count_independent_of_depth(self):
+        """スレッドの深さに関わらずクエリ数が一定であることを検証"""
+        self.add_thread(2)
+        shallow = self.count_queries()
+        self.add_thread(10)
+        self.assertEqual(self.count_queries(), shallow)
+
+
+class LikeAddOrDeleteApiTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('like@example.com', 'password', nick_name='like')
+        self.blog = Blog.objects.create(content='test', user=self.user)
+        self.url = reverse('api_like', args=[self.blog.pk])
+        self.client.force_login(self.user)
+
+    def test_toggle(self):
+        """POSTのたびにいいねと解除が切り替わることを検証"""
+        self.assertEqual(self.client.post(self.url).json(), {'like': 1, 'liked': True})
+        self.assertEqual(Like.objects.filter(post=self.blog).count(), 1)
+        self.assertEqual(self.client.post(self.url).json(), {'like': 0, 'liked': False})
+        self.assertFalse(Like.objects.exists())
+
+    def test_does_not_overwrite_content(self):
+        """いいねでポストの他の列を上書きしないことを検証"""
+        Blog.objects.filter(pk=self.blog.pk).update(content='edited')
+        self.client.post(self.url)
+        self.assertEqual(Blog.objects.get(pk=self.blog.pk).content, 'edited')
+
+    def test_get_is_not_allowed(self):
+        """GETでは状態を変えないことを検証"""
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        self.assertFalse(Like.objects.exists())
+
+    def test_missing_blog(self):
+        """存在しないポストは404になることを検証"""
+        response = self.client.post(reverse('api_like', args=[self.blog.pk + 1]))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Like.objects.exists())
+
+
+class LikeStateTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('state@example.com', 'password', nick_name='state')
+        self.blogs = [Blog.objects.create(content='post%d' % i, user=self.user) for i in range(3)]
+        Like.objects.create(user=self.user, post=self.blogs[1])
+        Blog.objects.filter(pk=self.blogs[1].pk).update(like_num=1)
+
+    def test_timeline_has_like_state(self):
+        """タイムラインの各ポストにいいね済みかが付くことを検証"""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('index'))
+        liked = {blog.content: blog.liked_by_me for blog in response.context['blog_list']}
+        self.assertEqual(liked, {'post0': False, 'post1': True, 'post2': False})
+
+    def test_like_list_api(self):
+        """複数ポストのいいね数を1クエリでまとめて返すことを検証"""
+        self.client.force_login(self.user)
+        ids = ','.join(str(blog.pk) for blog in self.blogs)
+        with self.assertNumQueries(3):  # セッション、ユーザー、ポスト
+            likes = self.client.get(reverse('api_likes'), {'ids': ids + ',x'}).json()['likes']
+        self.assertEqual(likes[str(self.blogs[1].pk)], {'like': 1, 'liked': True})
+        self.assertEqual(likes[str(self.blogs[0].pk)], {'like': 0, 'liked': False})
+
+    def test_like_list_api_anonymous(self):
+        """未ログインではいいね済みは常にFalseになることを検証"""
+        likes = self.client.get(reverse('api_likes'), {'ids': str(self.blogs[1].pk)}).json()['likes']
+        self.assertEqual(likes[str(self.blogs[1].pk)], {'like': 1, 'liked': False})
+
+    def test_like_list_api_rejects_bad_ids(self):
+        """数字以外や桁数の多すぎるidは無視し、500にしないことを検証"""
+        ids = '²,１,-1,99999999999999999999,%s' % self.blogs[1].pk
+        response = self.client.get(reverse('api_likes'), {'ids': ids})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json()['likes']), [str(self.blogs[1].pk)])
+
+
+class ProfileDetailViewTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('profile@example.com', 'password', nick_name='profile')
+        for i in range(12):
+            Blog.objects.create(content='post%d' % i, user=self.user, like_num=i)
+
+    def test_paginated_with_stats(self):
+        """投稿一覧をページングし、投稿数ともらったいいね数を表示することを検証"""
+        url = reverse('profile_detail', args=['profile'])
+        response = self.client.get(url)
+        self.assertEqual(response.context['object'].user, self.user)
+        self.assertEqual(len(response.context['blog_list']), 10)
+        self.assertEqual(response.context['stats'], {'post_count': 12, 'likes_received': 66})
+        self.assertContains(response, 'もらったいいね 66')
+
+        page = response.context['page_obj']
+        response = self.client.get(url, {'cursor': page.next_cursor})
+        self.assertEqual([blog.content for blog in response.context['blog_list']], ['post1', 'post0'])
+
+    def test_query_count(self):
+        """プロフィールは1回のJOIN、投稿一覧は1回のクエリで取得することを検証"""
+        # 匿名ユーザーはページごとキャッシュされるので、ログインして確認する
+        self.client.force_login(self.user)
+        url = reverse('profile_detail', args=['profile'])
+        self.client.get(url)  # 統計をキャッシュする
+        # セッション、ユーザー、ETag用の集計3つ、プロフィール、投稿一覧
+        with self.assertNumQueries(7):
+            self.client.get(url)
+
+    def test_missing_user(self):
+        """存在しないユーザーは404を返すことを検証"""
+        self.assertEqual(self.client.get(reverse('profile_detail', args=['nobody'])).status_code, 404)
+
+
+class BlogCreateViewTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('create@example.com', 'password', nick_name='create')
+        self.client.force_login(self.user)
+
+    def test_tags_from_text_field(self):
+        """タグは自由入力のフィールドだけで受け取り、全タグの選択肢を描画しないことを検証"""
+        Tag.objects.create(name='既存タグ')
+        response = self.client.get(reverse('create'))
+        self.assertNotContains(response, '<select')
+        self.assertNotContains(response, '既存タグ')
+
+        self.client.post(reverse('create'), {'content': 'tagged', 'tag': '既存タグ、新タグ'})
+        blog = Blog.objects.get(content='tagged')
+        self.assertEqual(sorted(blog.tag.values_list('name', flat=True)), ['新タグ', '既存タグ'])
+
+    def test_tag_from_anime_title(self):
+        """アニメ検索から来たときはタイトルをタグの初期値にすることを検証"""
+        response = self.client.get(reverse('create_by_anime', args=['フリクリ']))
+        self.assertEqual(response.context['form'].initial['tag'], 'フリクリ')
+
+    def test_author_from_request(self):
+        """投稿者はフォームの値ではなくログインユーザーになることを検証"""
+        other = User.objects.create_user('other@example.com', 'password', nick_name='other')
+        self.client.post(reverse('create'), {'user': other.pk, 'content': 'mine'})
+        self.assertEqual(Blog.objects.get(content='mine').user, self.user)
+
+        blog = Blog.objects.create(content='others', user=other)
+        response = self.client.post(reverse('update', args=[blog.pk]), {'content': 'taken'})
+        self.assertEqual(response.status_code, 404)
+        blog.refresh_from_db()
+        self.assertEqual((blog.content, blog.user), ('others', other))
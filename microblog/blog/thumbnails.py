@@ -0,0 +1,112 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import Signal, receiver
+
+from blog.models import Blog, UserProfile
+
+logger = logging.getLogger(__name__)
+
+# 作成する横幅(px)
+THUMBNAIL_WIDTHS = getattr(settings, 'THUMBNAIL_WIDTHS', (320, 640, 1280))
+# 作成する形式と拡張子、保存時のオプション
+THUMBNAIL_FORMATS = (
+    ('webp', 'WEBP', {'quality': 80}),
+    ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+# 元画像と同じ階層のこのディレクトリに保存する（media/anicolleblog/thumbs/...）
+THUMBNAIL_DIR = 'thumbs'
+
+executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='thumbnails')
+
+# 派生画像を作り終えたときに送る
+derivatives_generated = Signal(providing_args=['name', 'widths'])
+
+
+def derivative_name(name, width, ext):
+    """元画像のファイル名から派生画像のファイル名を作る"""
+    # 拡張子違いの同名ファイルとぶつからないよう、元の拡張子も残す（photo.png → thumbs/photo.png_640.webp）
+    directory, filename = os.path.split(name)
+    return os.path.join(directory, THUMBNAIL_DIR, '%s_%d.%s' % (filename, width, ext)).replace(os.sep, '/')
+
+
+def generate_derivatives(name, storage=default_storage):
+    """元画像を縮小してWebPとJPEGの派生画像を作る。作成した横幅のリストを返す"""
+    with storage.open(name, 'rb') as f:
+        image = Image.open(f)
+        image.load()
+
+    # スマホ写真の向きを反映し、透過を落とす
+    image = ImageOps.exif_transpose(image).convert('RGB')
+    widths = [width for width in THUMBNAIL_WIDTHS if width < image.width]
+
+    for width in widths:
+        height = round(image.height * width / image.width)
+        resized = image.resize((width, height), Image.LANCZOS)
+        for ext, pil_format, options in THUMBNAIL_FORMATS:
+            path = derivative_name(name, width, ext)
+            if storage.exists(path):
+                storage.delete(path)
+            buffer = BytesIO()
+            resized.save(buffer, pil_format, **options)
+            storage.save(path, ContentFile(buffer.getvalue()))
+
+    cache.set(cache_key(name), widths, None)
+    derivatives_generated.send(sender=None, name=name, widths=widths)
+    return widths
+
+
+def cache_key(name):
+    return 'thumbnails:%s' % name
+
+
+def available_widths(name, storage=default_storage):
+    """作成済みの派生画像の横幅。まだ無ければ空リスト"""
+    widths = cache.get(cache_key(name))
+    if widths is None:
+        widths = [width for width in THUMBNAIL_WIDTHS
+                  if all(storage.exists(derivative_name(name, width, ext)) for ext, _, _ in THUMBNAIL_FORMATS)]
+        # 作成中の可能性があるので、見つかったときだけ覚えておく
+        if widths:
+            cache.set(cache_key(name), widths, None)
+    return widths
+
+
+def _generate(name):
+    try:
+        generate_derivatives(name)
+    except Exception:
+        logger.exception('派生画像の作成に失敗しました: %s', name)
+
+
+def schedule(name):
+    """コミット後にリクエストとは別のスレッドで派生画像を作る"""
+    cache.delete(cache_key(name))
+    transaction.on_commit(lambda: executor.submit(_generate, name))
+
+
+def ensure_derivatives(name):
+    """派生画像がまだ無ければ作成を予約する"""
+    if cache.get(cache_key(name)) is None and not available_widths(name):
+        schedule(name)
+
+
+@receiver(post_save, sender=Blog)
+def blog_photo_saved(sender, instance, **kwargs):
+    if instance.photo:
+        ensure_derivatives(instance.photo.name)
+
+
+@receiver(post_save, sender=UserProfile)
+def profile_picture_saved(sender, instance, **kwargs):
+    if instance.picture:
+        ensure_derivatives(instance.picture.name)
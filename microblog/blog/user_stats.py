@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from blog.models import Blog
+
+# いいね数はポストの行を書き換えるたびに消すと多すぎるので、この秒数だけ古い値を許す
+USER_STATS_TTL = getattr(settings, 'USER_STATS_TTL', 60)
+
+
+def cache_key(user_id):
+    return 'user_stats:%s' % user_id
+
+
+def user_stats(user_id, refresh=False):
+    """ユーザーの投稿数と、もらったいいねの合計。refreshならキャッシュを使わずに集計し直す"""
+    stats = None if refresh else cache.get(cache_key(user_id))
+    if stats is None:
+        stats = Blog.objects.filter(user_id=user_id).aggregate(
+            post_count=Count('id'), likes_received=Sum('like_num'))
+        stats['likes_received'] = stats['likes_received'] or 0
+        cache.set(cache_key(user_id), stats, USER_STATS_TTL)
+    return stats
+
+
+@receiver(post_save, sender=Blog)
+def blog_created(sender, instance, created, **kwargs):
+    if created:
+        cache.delete(cache_key(instance.user_id))
+
+
+@receiver(post_delete, sender=Blog)
+def blog_deleted(sender, instance, **kwargs):
+    cache.delete(cache_key(instance.user_id))
@@ -1,12 +1,25 @@
+from django.db.models import Min
 from django.shortcuts import render
 from blog.forms import SearchForm
+from blog.models import Anime
 from blog.views import blog_option_view
-import requests
+
+
+def search_anime(year, cours):
+    """
+    同期済みのアニメテーブルを放送年(とクール)で検索する。
+    テーブルはmanage.py sync_animeで更新し、リクエスト中に外部APIは呼ばない。
+    """
+    anime_list = Anime.objects.filter(year=year)
+    if cours:
+        return anime_list.filter(cours=cours)
+    # 2クールにまたがる作品はクールごとに行があるので、年だけのときは作品(api_id)ごとに1行にする
+    first_rows = anime_list.values('api_id').annotate(first_id=Min('id')).values('first_id')
+    return anime_list.filter(id__in=first_rows)
 
 
 # アニメ検索機能（関数ビューの知見）
 def api_call(request):
-    endpoint = 'http://api.moemoe.tokyo/anime/v1/master'
 
     # リクエストがpostであることをチェック
     if request.method == 'POST':
@@ -19,23 +32,14 @@ def api_call(request):
             year = form.cleaned_data['year']
             cours = form.cleaned_data['cours']
 
-            if year:
-                query = str(year)
-                url = endpoint + "/" + query
-
-            else:
+            if not year:
                 form = SearchForm()
                 messages = ["放送年を選択してください"]
                 context = {'messages': messages, 'form': form}
 
                 return render(request, 'blog/anime_search.html', context)
 
-            if cours:
-                query = str(cours)
-                url = url + "/" + query
-
-            response = requests.get(url)
-            anime_list = response.json()
+            anime_list = search_anime(year, cours)
 
             form = SearchForm()
 
@@ -64,18 +68,13 @@ def api_call(request):
 
         # ページネーションバーからGETで遷移したときの処理
         # ページネーションしてきたときはクエリにyear,coursがあるのでそれを判定して分岐に入る
-        if 'year' in request.GET:
-            year = request.GET.get('year')
-            url = endpoint + "/" + year
-
-            cours = request.GET.get('cours')
-
-            if cours:
-                cours = request.GET.get('cours')
-                url = url + "/" + cours
+        query = SearchForm(request.GET)
+        if 'year' in request.GET and query.is_valid() and query.cleaned_data['year']:
+            year = query.cleaned_data['year']
+            cours = query.cleaned_data['cours']
 
-            response = requests.get(url)
-            anime_list = response.json()
+            # ページングはDB側で行う
+            anime_list = search_anime(year, cours)
             page_obj = blog_option_view.paginate_queryset(request, anime_list, 10)
 
             context = {
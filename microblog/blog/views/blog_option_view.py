@@ -1,14 +1,30 @@
+import re
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.views.generic import View
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth import get_user_model
+from django.http import Http404
 from django.http.response import JsonResponse
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.urls import reverse
+from django.utils import formats, timezone
 from blog.models import Blog, Comment, Like
 from blog.forms import CommentForm
+from blog import like_counter
+from blog.pagination import CursorPaginator, InvalidCursor
+from blog.tag_index import tag_index
 
 User = get_user_model()
 
+# 1ページに表示するコメント数
+COMMENT_PAGE_SIZE = 20
+# 詳細ページでコメントごとに先に表示しておく返信数
+REPLY_PREVIEW_SIZE = 3
+
 
 def paginate_queryset(request, queryset, count):
     """Pageオブジェクトを返す。"""
@@ -24,6 +40,103 @@ def paginate_queryset(request, queryset, count):
     return page_obj
 
 
+def build_comment_tree(comments):
+    """
+    1クエリで取得したコメント一覧から返信ツリーを組み立てる。
+    各コメントのrepliesに子コメントを入れ、トップレベルのコメントのリストを返す。
+    """
+    comments = list(comments)
+    by_id = {comment.pk: comment for comment in comments}
+    roots = []
+
+    for comment in comments:
+        comment.replies = []
+
+    for comment in comments:
+        parent = by_id.get(comment.parent_id)
+        if parent is None:
+            roots.append(comment)
+        else:
+            parent.replies.append(comment)
+
+    return roots
+
+
+def comment_paginator(queryset, count=COMMENT_PAGE_SIZE):
+    """コメントを投稿順(commented_date, id)にカーソルでページングする。返信数も付ける"""
+    queryset = queryset.annotate(reply_count=Count('comment'))
+    return CursorPaginator(queryset, count, ordering_field='commented_date', descending=False)
+
+
+def paginate_comments(queryset, cursor=None, count=COMMENT_PAGE_SIZE):
+    """カーソルに対応するコメントのページを返す。不正なカーソルなら先頭ページ"""
+    paginator = comment_paginator(queryset, count)
+    try:
+        return paginator.page(cursor)
+    except InvalidCursor:
+        return paginator.page()
+
+
+def reply_previews(comments, count=REPLY_PREVIEW_SIZE):
+    """
+    各コメントの最初のcount件の返信を1クエリで取得する。
+    残りの返信があるコメントにはmore_replies_cursorを付ける。
+    """
+    # 同じ親への返信のうち、自分より前のものの数。IN (... LIMIT n)のサブクエリはMySQLが受け付けないので、
+    # (parent, commented_date)のインデックスで数えて順位にする
+    earlier = (Comment.objects.filter(parent=OuterRef('parent'))
+               .filter(Q(commented_date__lt=OuterRef('commented_date')) |
+                       Q(commented_date=OuterRef('commented_date'), pk__lt=OuterRef('pk')))
+               .order_by().values('parent').annotate(count=Count('pk')).values('count'))
+    first_replies = (Comment.objects.filter(parent__in=[comment.pk for comment in comments])
+                     .annotate(position=Coalesce(Subquery(earlier, output_field=IntegerField()), 0))
+                     .filter(position__lt=count))
+    replies = list(
+        Comment.objects.filter(pk__in=first_replies.values('pk'))
+        .annotate(reply_count=Count('comment'))
+        .order_by('commented_date', 'id')
+    )
+
+    paginator = comment_paginator(Comment.objects.none())
+    last_reply = {reply.parent_id: reply for reply in replies}
+    for comment in comments:
+        shown = last_reply.get(comment.pk)
+        if shown and comment.reply_count > count:
+            comment.more_replies_cursor = paginator.encode_cursor(shown, 'next')
+
+    return replies
+
+
+def comment_to_dict(comment):
+    """JSONで返すコメントの形"""
+    return {
+        'id': comment.pk,
+        'content': comment.content,
+        'commented_date': formats.localize(timezone.localtime(comment.commented_date)),
+        'reply_count': comment.reply_count,
+        'reply_url': reverse('reply_create', kwargs={'comment_pk': comment.pk}),
+        'replies_url': reverse('api_replies', kwargs={'comment_pk': comment.pk}),
+    }
+
+
+def comment_page_response(request, queryset):
+    page = paginate_comments(queryset, request.GET.get('cursor'))
+    return JsonResponse({
+        'comments': [comment_to_dict(comment) for comment in page],
+        'next_cursor': page.next_cursor,
+    })
+
+
+def comment_list_api(request, blog_pk):
+    """記事のトップレベルコメントの続きをJSONで返す"""
+    return comment_page_response(request, Comment.objects.filter(post_id=blog_pk, parent__isnull=True))
+
+
+def reply_list_api(request, comment_pk):
+    """コメントへの返信(サブツリーの1階層分)をJSONで返す"""
+    return comment_page_response(request, Comment.objects.filter(parent_id=comment_pk))
+
+
 def comment_create(request, blog_pk):
     """記事へのコメント作成"""
     post = get_object_or_404(Blog, pk=blog_pk)
@@ -63,28 +176,74 @@ def reply_create(request, comment_pk):
     return render(request, 'blog/comment_form.html', context)
 
 
-class LikeAddOrDeleteApi(LoginRequiredMixin, View):
-    """いいねをするorいいねを解除するAPI"""
+# まとめて問い合わせできるポスト数の上限
+LIKE_LIST_MAX_IDS = 100
+# ポストのidとして受け付ける文字列（isdigit()は「²」なども通してしまう）。主キーの範囲を超える桁数は弾く
+POST_ID_RE = re.compile(r'[0-9]{1,9}')
+
 
-    def get(self, request, **kwargs):
-        blog = Blog.objects.get(id=kwargs['blog_pk'])
-        is_like = Like.objects.filter(user=request.user).filter(post=blog).count()
+def like_list_api(request):
+    """?ids=1,2,3 のポストのいいね数と、ログインユーザーがいいね済みかをまとめて返す"""
+    ids = [int(blog_id) for blog_id in request.GET.get('ids', '').split(',')[:LIKE_LIST_MAX_IDS]
+           if POST_ID_RE.fullmatch(blog_id)]
+    rows = (Blog.objects.filter(pk__in=ids).with_like_state(request.user)
+            .values_list('pk', 'like_num', 'liked_by_me'))
 
-        # いいねを解除する
-        if is_like > 0:
-            liking = Like.objects.get(post__id=kwargs['blog_pk'], user=request.user)
-            liking.delete()
-            blog.like_num -= 1
-            blog.save()
+    likes = {}
+    for blog_pk, like_num, liked in rows:
+        if like_counter.is_buffered():
+            like_num += like_counter.like_counter.pending(blog_pk)
+        likes[blog_pk] = {"like": like_num, "liked": liked}
 
-            return JsonResponse({"like": blog.like_num})
+    return JsonResponse({"likes": likes})
 
-        # いいねする
-        blog.like_num += 1
-        blog.save()
-        like = Like()
-        like.user = request.user
-        like.post = blog
-        like.save()
 
-        return JsonResponse({"like": blog.like_num})
\ No newline at end of file
+class LikeAddOrDeleteApi(LoginRequiredMixin, View):
+    """いいねをするorいいねを解除するAPI"""
+
+    def post(self, request, **kwargs):
+        blog_pk = kwargs['blog_pk']
+
+        with transaction.atomic():
+            # いいね済みなら解除する（存在すれば消えるだけの条件付きDELETE）
+            deleted, _ = Like.objects.filter(post_id=blog_pk, user=request.user).delete()
+            liked = not deleted
+
+            if liked:
+                try:
+                    # (user, post)のユニーク制約で同時押しでも1件しかできない
+                    with transaction.atomic():
+                        Like.objects.create(post_id=blog_pk, user=request.user)
+                except IntegrityError:
+                    # 別リクエストが先にいいねしていたので件数は変えない
+                    delta = 0
+                else:
+                    delta = 1
+            else:
+                delta = -1
+
+            if like_counter.is_buffered():
+                # 件数の書き込みはバッファに任せる
+                if not Blog.objects.filter(pk=blog_pk).exists():
+                    raise Http404
+            # 件数はDB側で増減し、他の列は書き換えない
+            elif not Blog.objects.filter(pk=blog_pk).update(like_num=F('like_num') + delta):
+                raise Http404
+
+        if like_counter.is_buffered():
+            like_counter.like_counter.add(blog_pk, delta)
+            # まだDBに書き込まれていない分も含めて返す
+            like_num = like_counter.like_counter.like_num(blog_pk)
+        else:
+            like_num = Blog.objects.filter(pk=blog_pk).values_list('like_num', flat=True).get()
+        return JsonResponse({"like": like_num, "liked": liked})
+
+
+# タグ入力の候補の数
+TAG_AUTOCOMPLETE_LIMIT = 10
+
+
+def tag_autocomplete_api(request):
+    """?q=で始まるタグを、付いているポストの多い順に返す（DBは引かずにプロセス内の索引から返す）"""
+    tags = tag_index.search(request.GET.get('q', ''), TAG_AUTOCOMPLETE_LIMIT)
+    return JsonResponse({"tags": [{"name": name, "post_count": post_count} for name, post_count in tags]})
@@ -2,50 +2,123 @@ from django.views.generic import ListView, DetailView, CreateView, UpdateView, D
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth import get_user_model
+from django.db.models import Count, Max, Sum
 from django.urls import reverse_lazy
-from blog.models import Blog, Like, Tag
-from blog.forms import BlogForm, TagInlineFormSet
-import re
+from blog.models import Blog, BlogTag, Like, Tag, liked_by
+from blog.forms import BlogForm
+from blog import like_counter
+from blog.page_cache import AnonymousPageCacheMixin, ConditionalGetMixin, TIMELINE, blog_page, tag_page
+from blog.pagination import CursorPaginationMixin, InvalidCursor
+from blog.tag_query import TagExpressionPaginator, expression_keys, parse_tag_expression, resolve_tag_groups
+from blog.views.blog_option_view import build_comment_tree, paginate_comments, reply_previews
+from blog.tagging import add_tags, split_tag_names, sync_tags
 
 User = get_user_model()
 
 
-class BlogListView(ListView):
+class BlogListView(AnonymousPageCacheMixin, ConditionalGetMixin, CursorPaginationMixin, ListView):
     model = Blog
     # レスポンスに込めるobjectの名前を変える
     context_object_name = "blog_list"
     paginate_by = 10
 
+    def page_cache_dependencies(self):
+        return [TIMELINE]
 
-class BlogByTagList(ListView):
+    def page_etag_state(self):
+        # ポストの投稿・編集・削除（ニックネームの変更を含む）と、いいねの付け外し
+        return (Blog.objects.aggregate(Count('id'), Max('updated_date'), Sum('like_num')),
+                Like.objects.aggregate(Count('id'), Max('id')))
+
+    def get_queryset(self):
+        return Blog.objects.select_related('user').with_like_state(self.request.user)
+
+
+class BlogByTagList(AnonymousPageCacheMixin, CursorPaginationMixin, ListView):
     model = Blog
     context_object_name = "blog_list"
+    template_name = "blog/blog_list.html"
     paginate_by = 10
-    slug_field = "tag"
-    slug_url_kwarg = "tag"
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        tag = Tag.objects.get_or_none(name=self.kwargs['tag'])
+    def page_cache_dependencies(self):
+        # タグ式（a+b、a|b）なら式に出てくるどのタグが変わってもページを捨てる
+        return [tag_page(key) for key in expression_keys(self.kwargs['tag'])]
+
+    def get(self, request, *args, **kwargs):
+        self.tag = Tag.objects.get_by_name(self.kwargs['tag'])
+        self.tag_groups = None
 
-        if not tag:
+        # 「+」「|」を含む名前のタグがあればそちらを優先し、無ければタグ式として扱う
+        groups = None if self.tag else parse_tag_expression(self.kwargs['tag'])
+        if groups:
+            self.tag_groups = resolve_tag_groups(groups)
+
+        if not self.tag and not self.tag_groups:
             messages.error(self.request, str("タグに「" + self.kwargs['tag'] + "」がつく投稿はありません"))
-            context['blog_list'] = Blog.objects.all()
-            return context
 
-        context['blog_list'] = Blog.objects.filter(tag=tag)
-        context['tag'] = tag
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        # タグが無い場合は通常のタイムラインと同じくページングして返す
+        if not self.tag:
+            return Blog.objects.select_related('user').with_like_state(self.request.user)
+
+        # 中間テーブルの(tag, posted_date)インデックスで並べ、ポストはJOINで取得する
+        return (BlogTag.objects.filter(tag=self.tag).select_related('blog__user')
+                .annotate(liked_by_me=liked_by(self.request.user, 'blog_id')))
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.tag_groups:
+            # タグ式はタグごとのポスティングリストを積集合・和集合してページングする
+            paginator = TagExpressionPaginator(self.tag_groups, page_size, self.request.user)
+            try:
+                page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+            except InvalidCursor:
+                page = paginator.page()
+            return paginator, page, page.object_list, page.has_other_pages()
+
+        paginator, page, object_list, is_paginated = super().paginate_queryset(queryset, page_size)
+
+        if self.tag:
+            for blog_tag in object_list:
+                blog_tag.blog.liked_by_me = blog_tag.liked_by_me
+            page.object_list = object_list = [blog_tag.blog for blog_tag in object_list]
+
+        return paginator, page, object_list, is_paginated
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+
+        if self.tag:
+            context['tag'] = self.tag
+        elif self.tag_groups:
+            context['tag_expression'] = self.kwargs['tag']
         return context
 
 
-class BlogDetailView(DetailView):
+class BlogDetailView(AnonymousPageCacheMixin, ConditionalGetMixin, DetailView):
     model = Blog
 
+    def page_cache_dependencies(self):
+        return [blog_page(self.kwargs['pk'])]
+
+    def page_etag_state(self):
+        # ポスト本体といいね数、コメントの件数と最新のコメント
+        state = list(Blog.objects.filter(pk=self.kwargs['pk'])
+                     .annotate(Count('comment'), Max('comment__id'))
+                     .values_list('updated_date', 'like_num', 'comment__count', 'comment__id__max'))
+        if like_counter.is_buffered():
+            state.append(like_counter.like_counter.pending(self.kwargs['pk']))
+        return state
+
     def get_context_data(self, **kwargs):
         # 継承元のメソッドを呼び出す
         context = super().get_context_data(**kwargs)
-        # 記事へのコメントを取得
-        context['comment_list'] = self.object.comment_set.filter(parent__isnull=True)
+        # トップレベルのコメントを1ページ分と、その返信の先頭数件だけを取得してツリーにする
+        comment_page = paginate_comments(self.object.comment_set.filter(parent__isnull=True))
+        replies = reply_previews(comment_page.object_list)
+        context['comment_list'] = build_comment_tree(comment_page.object_list + replies)
+        context['comment_page'] = comment_page
         tags = self.object.tag.filter(blog=kwargs['object'])
         tag_list = []
 
@@ -53,7 +126,10 @@ class BlogDetailView(DetailView):
             tag_list.append(str(tag.name))
 
         context['tags'] = tag_list
-        context['like_cnt'] = Like.objects.filter(post=kwargs['object']).count()
+        # いいね数は非正規化したlike_numを使う（バッファ中の増減も含める）
+        context['like_cnt'] = self.object.like_num
+        if like_counter.is_buffered():
+            context['like_cnt'] += like_counter.like_counter.pending(self.object.pk)
         return context
 
 
@@ -68,43 +144,18 @@ class BlogCreateView(LoginRequiredMixin, CreateView):
     # templateをクラス汎用ビューのデフォルトから変える
     template_name = "blog/blog_create_form.html"
 
-    def get_context_data(self, **kwargs):
-        context = super(BlogCreateView, self).get_context_data(**kwargs)
-        context.update(dict(formset=TagInlineFormSet(self.request.POST or None, instance=self.object)))
-
-        return context
-
     # バリデート後
     def form_valid(self, form):
+        # タグは自由入力のtagフィールドだけで受け取る
+        tag_list = split_tag_names(form.cleaned_data['tag'])
 
-        context = self.get_context_data()
-        formset = context['formset']
-        if formset.is_valid():
-            tags = self.request.POST.get("tag")
-            tag_list = re.split("[,、]", tags)
-
-            blog = form.save(commit=False)
-            blog.save()
-
-            for tag in tag_list:
-                tag = tag.strip()
-                if tag != "":
-                    exists_tag = Tag.objects.get_or_none(name=tag)
-
-                    if exists_tag:
-                        blog.tag.add(exists_tag)
-                    else:
-                        tag_obj = Tag(name=tag)
-                        tag_obj.save()
-                        blog.tag.add(tag_obj)
-
-            messages.success(self.request, "保存しました。")
-            return super().form_valid(form)
+        blog = form.save(commit=False)
+        blog.user = self.request.user
+        blog.save()
+        add_tags(blog, tag_list)
 
-        else:
-            context['form'] = form
-            messages.error(self.request, "保存に失敗しました。")
-            return self.render_to_response(context)
+        messages.success(self.request, "保存しました。")
+        return super().form_valid(form)
 
     def form_invalid(self, form):
         # self.requestオブジェクトに”保存に失敗しました。”を込める
@@ -116,13 +167,9 @@ class BlogByAnimeCreateView(BlogCreateView):
     slug_field = "anime"
     slug_url_kwarg = "anime"
 
-    def get_context_data(self, **kwargs):
-        context = super(BlogByAnimeCreateView, self).get_context_data(**kwargs)
-        context.update(dict(formset=TagInlineFormSet(self.request.POST or None, instance=self.object)))
-        return context
-
     def get_initial(self):
         initial = super().get_initial()
+        # アニメ検索の結果からタイトルをそのまま渡してくるので、タグにする
         initial["tag"] = self.kwargs['anime']
         return initial
 
@@ -133,24 +180,13 @@ class BlogUpdateView(LoginRequiredMixin, UpdateView):
 
     login_url = '/login'
 
-    def get_context_data(self, **kwargs):
-        context = super(BlogUpdateView, self).get_context_data(**kwargs)
-        context.update(dict(formset=TagInlineFormSet(self.request.POST or None, instance=self.object)))
-        tags = self.object.tag.filter(**kwargs)
-        tag_list = []
-
-        for tag in tags:
-            tag_list.append(str(tag.name))
-
-        context['tags'] = tag_list
-        return context
+    def get_queryset(self):
+        # 投稿者はフォームから受け取らないので、自分のポストだけを編集できるようにする
+        return Blog.objects.filter(user=self.request.user)
 
     def get_initial(self):
         initial = super().get_initial()
-        tags = self.object.tag.filter(blog=self.kwargs['pk'])
-        tag_list = (','.join([str(tag) for tag in tags]))
-
-        initial["tag"] = tag_list
+        initial["tag"] = ','.join(self.object.tag.values_list('name', flat=True))
         return initial
 
     # success_urlを自作する
@@ -168,8 +204,7 @@ class BlogUpdateView(LoginRequiredMixin, UpdateView):
     # バリデート後
     def form_valid(self, form):
 
-        tags = self.request.POST.get("tag")
-        tag_list = re.split("[,、]", tags)
+        tags = form.cleaned_data['tag']
 
         blog = form.save(commit=False)
         blog.save()
@@ -178,19 +213,8 @@ class BlogUpdateView(LoginRequiredMixin, UpdateView):
             messages.success(self.request, "更新しました。")
             return super().form_valid(form)
 
-        blog.tag.clear()
-
-        for tag in tag_list:
-            tag = tag.strip()
-            if tag != "":
-                exists_tag = Tag.objects.get_or_none(name=tag)
-
-                if exists_tag:
-                    blog.tag.add(exists_tag)
-                else:
-                    tag_obj = Tag(name=tag)
-                    tag_obj.save()
-                    blog.tag.add(tag_obj)
+        # 付け外しの差分だけを反映する
+        sync_tags(blog, split_tag_names(tags))
 
         messages.success(self.request, "更新しました。")
         return super().form_valid(form)
@@ -0,0 +1,151 @@
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags
+from django.views.decorators.http import require_safe
+
+# 内容のハッシュ名で保存した画像とその派生画像（blog.storage.ContentAddressedStorage）
+HASHED_NAME_RE = re.compile(r'^[0-9a-f]{64}(\.|$)')
+# ハッシュ名の画像は内容が変わらないので1年キャッシュさせる
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+MEDIA_CACHE_MAX_AGE = getattr(settings, 'MEDIA_CACHE_MAX_AGE', 60 * 60)
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def is_hashed(path):
+    """ファイル名が内容のハッシュで決まっている（内容が変わらない）ファイルかどうか"""
+    return bool(HASHED_NAME_RE.match(posixpath.basename(path)))
+
+
+def media_etag(path, stat):
+    """強いETag。ハッシュ名のファイルはファイル名、それ以外は更新日時とサイズから作る"""
+    if is_hashed(path):
+        return '"%s"' % posixpath.basename(path)
+    return '"%x-%x"' % (stat.st_mtime_ns, stat.st_size)
+
+
+def cache_control(path):
+    if is_hashed(path):
+        return IMMUTABLE_CACHE_CONTROL
+    return 'public, max-age=%d' % MEDIA_CACHE_MAX_AGE
+
+
+def parse_range(header, size):
+    """
+    Rangeヘッダーから(開始, 終了)を返す。範囲指定が1つでない場合はNone（全体を返す）、
+    満たせない範囲ならValueErrorを送出する。
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # bytes=-500 は末尾500バイト
+        length = int(end)
+        if length == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def read_range(full_path, start, end):
+    with open(full_path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    アップロード画像を返す。ETagとIf-None-Match、1つの範囲のRangeに対応し、
+    MEDIA_ACCELを設定していればファイルの送信をフロントのサーバーに任せる。
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    etag = media_etag(path, stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': cache_control(path),
+    }
+
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+        response = HttpResponseNotModified()
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    # 'x-accel-redirect'(nginx)か'x-sendfile'(Apache等)なら、本体はフロントのサーバーが送る（Rangeもそちらで処理される）
+    accel = getattr(settings, 'MEDIA_ACCEL', None)
+    if accel:
+        response = HttpResponse(content_type=content_type)
+        if accel == 'x-accel-redirect':
+            # nginxのinternalなlocationに振り替える
+            prefix = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+            response['X-Accel-Redirect'] = prefix + path.lstrip('/')
+        else:
+            response['X-Sendfile'] = full_path
+    else:
+        byte_range = None
+        range_header = request.META.get('HTTP_RANGE')
+        if_range = request.META.get('HTTP_IF_RANGE')
+        # If-Rangeが今のETagと違えば、範囲指定を無視して全体を返す
+        if range_header and (not if_range or if_range.strip() == etag):
+            try:
+                byte_range = parse_range(range_header, stat.st_size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = 'bytes */%d' % stat.st_size
+                return response
+
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(read_range(full_path, start, end), status=206,
+                                             content_type=content_type)
+            response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, stat.st_size)
+            response['Content-Length'] = end - start + 1
+        elif request.method == 'HEAD':
+            response = HttpResponse(content_type=content_type)
+            response['Content-Length'] = stat.st_size
+        else:
+            response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+            response['Content-Length'] = stat.st_size
+
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Accept-Ranges'] = 'bytes'
+    for name, value in headers.items():
+        response[name] = value
+    return response
@@ -0,0 +1,27 @@
+from django.shortcuts import render
+from django.views.decorators.http import require_safe
+
+from blog.forms import PostSearchForm
+from blog.pagination import InvalidCursor
+from blog.search import search_posts
+
+# 1ページに出す検索結果の数
+SEARCH_PAGE_SIZE = 10
+
+
+@require_safe
+def post_search(request):
+    """投稿本文の全文検索。関連度の高い順に並べ、続きはカーソルで辿る"""
+    form = PostSearchForm(request.GET)
+    query = form.cleaned_data['q'].strip() if form.is_valid() else ''
+
+    context = {'form': form, 'query': query}
+    if query:
+        try:
+            page_obj = search_posts(query, SEARCH_PAGE_SIZE, request.GET.get('cursor'), request.user)
+        except InvalidCursor:
+            page_obj = search_posts(query, SEARCH_PAGE_SIZE, user=request.user)
+        context['blog_list'] = page_obj.object_list
+        context['page_obj'] = page_obj
+
+    return render(request, 'blog/post_search.html', context)
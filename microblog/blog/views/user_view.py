@@ -1,12 +1,15 @@
-from django.shortcuts import redirect
+from django.shortcuts import get_object_or_404, redirect
 from django.views.generic import DetailView, CreateView, UpdateView, TemplateView
 from django.contrib import messages
 from django.contrib.auth.views import LoginView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth import get_user_model
-from django.urls import reverse_lazy
-from blog.models import Blog, UserProfile
+from django.db.models import Count, Max, Sum
+from blog.models import Blog, Like, UserProfile
 from blog.forms import UserCreateForm, LoginForm, UserUpdateForm, ProfileFormSet
+from blog.page_cache import AnonymousPageCacheMixin, ConditionalGetMixin, profile_page
+from blog.pagination import CursorPaginationMixin
+from blog.user_stats import user_stats
 
 User = get_user_model()
 
@@ -37,20 +40,42 @@ class UserCreateDone(TemplateView):
     """ユーザー登録完了"""
 
 
-class ProfileDetailView(DetailView):
+class ProfileDetailView(AnonymousPageCacheMixin, ConditionalGetMixin, CursorPaginationMixin, DetailView):
     model = UserProfile
     slug_field = "nick_name"  # モデルのフィールドの名前
     slug_url_kwarg = "nick_name"  # urls.pyでのキーワードの名前
+    paginate_by = 10
+
+    def page_cache_dependencies(self):
+        return [profile_page(self.kwargs['nick_name'])]
+
+    def page_etag_state(self):
+        # プロフィール、そのユーザーのポストと、ポストへのいいね
+        nick_name = self.kwargs['nick_name']
+        return (list(UserProfile.objects.filter(user__nick_name=nick_name).values_list('picture', 'bio')),
+                Blog.objects.filter(user__nick_name=nick_name).aggregate(
+                    Count('id'), Max('updated_date'), Sum('like_num')),
+                Like.objects.filter(post__user__nick_name=nick_name).aggregate(Count('id'), Max('id')))
 
     def get_object(self, queryset=None):
-        user_id = User.objects.get(nick_name=self.kwargs['nick_name'])
-        return UserProfile.objects.get(user_id=user_id)
+        # ユーザーとプロフィールを1回のJOINで取得する
+        return get_object_or_404(UserProfile.objects.select_related('user'),
+                                 user__nick_name=self.kwargs['nick_name'])
 
     def get_context_data(self, **kwargs):
         # 継承元のメソッドを呼び出す
-        user_id = User.objects.get(nick_name=self.kwargs['nick_name'])
         context = super().get_context_data(**kwargs)
-        context['blog_list'] = Blog.objects.filter(user=user_id)
+        user_id = self.object.user_id
+
+        # 投稿一覧は(user, -posted_date)のインデックスを使ってカーソルでページングする
+        blog_list = Blog.objects.filter(user_id=user_id).with_like_state(self.request.user)
+        _, page, object_list, is_paginated = self.paginate_queryset(blog_list, self.paginate_by)
+
+        context['page_obj'] = page
+        context['is_paginated'] = is_paginated
+        context['blog_list'] = object_list
+        # ページキャッシュに入れるときは、集計のキャッシュの古い値を残さないよう集計し直す
+        context['stats'] = user_stats(user_id, refresh=self.page_cacheable)
         return context
 
 
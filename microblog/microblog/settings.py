@@ -146,6 +146,25 @@ LOGIN_REDIRECT_URL = '/'
 # mediaファイルのpathの定義
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
+# アップロード画像は内容のハッシュをファイル名にして、同じ画像を1つだけ保存する
+DEFAULT_FILE_STORAGE = 'blog.storage.ContentAddressedStorage'
+# 画像の送信をフロントのサーバーに任せる場合は 'x-accel-redirect'(nginx) か 'x-sendfile' にする
+MEDIA_ACCEL = None
+
+# キャッシュ。LocMemCacheはプロセスごとなので、キャッシュの無効化は書き込んだワーカーにしか届かない。
+# 匿名ユーザー向けのページキャッシュは期限なしでバージョンを振り直して捨てるので、
+# 複数ワーカーで動かすときはlocal_settingsで必ずRedisやmemcachedなどの共有キャッシュに変える
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+# プロフィールの投稿数・いいね数のキャッシュの秒数
+USER_STATS_TTL = 60
+
+# いいね数をプロセス内に溜めて、LIKE_COUNTER_FLUSH_INTERVAL秒ごとにまとめて書き込む
+LIKE_COUNTER_BUFFERED = False
+LIKE_COUNTER_FLUSH_INTERVAL = 0.3
 
 try:
     from .local_settings import *
@@ -1,11 +1,12 @@
+import re
+
 from django.contrib import admin
-from django.urls import path
+from django.urls import path, re_path
 from django.contrib.auth.views import LogoutView
-from blog.views import blog_view, blog_option_view, user_view, anime_search_view
+from blog.views import blog_view, blog_option_view, user_view, anime_search_view, media_view, post_search_view
 
 # 画像UL用
 from django.conf import settings
-from django.conf.urls.static import static
 
 urlpatterns = [
     # path('<URL>', views関数, ニックネーム(任意)),
@@ -27,6 +28,9 @@ urlpatterns = [
     # Shangrila API呼び出し用viewとのルーティング
     path('search', anime_search_view.api_call, name='search'),
 
+    # 投稿の全文検索
+    path('search/posts', post_search_view.post_search, name='search_posts'),
+
     # ユーザー登録機能とのルーティング
     path('user_create/', user_view.UserCreate.as_view(template_name='user_create.html'), name='user_create'),
     path('user_create/done', user_view.UserCreateDone.as_view(template_name='user_create_done.html'),
@@ -35,9 +39,15 @@ urlpatterns = [
     # コメント機能とのルーティング
     path('comment/<int:blog_pk>/', blog_option_view.comment_create, name='comment_create'),
     path('reply/<int:comment_pk>/', blog_option_view.reply_create, name='reply_create'),
+    path('api/comments/<int:blog_pk>/', blog_option_view.comment_list_api, name='api_comments'),
+    path('api/replies/<int:comment_pk>/', blog_option_view.reply_list_api, name='api_replies'),
 
     # いいね機能APIとのルーティング
     path("api/like/<int:blog_pk>/", blog_option_view.LikeAddOrDeleteApi.as_view(), name="api_like"),
+    path("api/likes", blog_option_view.like_list_api, name="api_likes"),
+
+    # タグ入力の候補
+    path("api/tags", blog_option_view.tag_autocomplete_api, name="api_tags"),
 
     # プロフィールとのルーティング
     path("<str:nick_name>/profile/", user_view.ProfileDetailView.as_view(template_name="blog/profile_detail.html")
@@ -51,6 +61,7 @@ urlpatterns = [
     path("<str:nick_name>/user_delete/", user_view.UserDeleteView.as_view(), name="user_delete"),
 ]
 
-# 画像UL用
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# 画像UL用（DEBUGでなくても配信する。MEDIA_ACCELを設定すれば送信はnginx等に任せる）
+urlpatterns += [
+    re_path(r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), media_view.serve_media, name='media'),
+]